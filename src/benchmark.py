@@ -0,0 +1,244 @@
+"""Benchmark suite of the solver kernels, e.g. :
+python src/benchmark.py --colors 2 8 --output bench.json
+python src/benchmark.py --output new.json --baseline bench.json
+
+Each benchmark is run once to warm up (caches, pattern matrices), then
+timed over repeats. Peak memory is measured with tracemalloc on one more run.
+Each vectorized result is checked against the naive implementation, on a
+sample for the big configurations."""
+
+import sys
+import json
+import time
+import random
+import argparse
+import platform
+import tracemalloc
+
+import numpy as np
+
+from solvers import EntropicSolver
+from utils import (
+    evaluate_pattern,
+    evaluate_pattern_matrix,
+    filter_pool_mask,
+    get_code_space,
+    get_entropies,
+)
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+NB_SAMPLES = 1000
+PERCENTILES = (10, 90)
+
+
+def get_max_rss():
+    """Peak resident memory of the process, in bytes (None if unknown)"""
+    if resource is None:
+        return None
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return max_rss if sys.platform == "darwin" else max_rss * 1024
+
+
+def measure(function, repeats):
+    """Time function() after a warmup run, then run it once more under tracemalloc"""
+    function()
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    tracemalloc.start()
+    function()
+    _, peak_bytes = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    low, high = np.percentile(times, PERCENTILES)
+    return {
+        "median": float(np.median(times)),
+        f"p{PERCENTILES[0]}": float(low),
+        f"p{PERCENTILES[1]}": float(high),
+        "min": min(times),
+        "repeats": repeats,
+        "peak_bytes": peak_bytes,
+        "max_rss_bytes": get_max_rss(),
+    }
+
+
+def get_sample(space, size, seed=0):
+    rng = np.random.default_rng(seed)
+    if space.size <= size:
+        return space.all_codes()
+    return np.sort(rng.choice(space.size, size, replace=False))
+
+
+def get_benchmarks(nb_colors):
+    """Return {name: (function, check)} for a configuration, check() telling if the
+    vectorized result matches the naive one"""
+    space = get_code_space(nb_colors)
+    pool = space.all_codes()
+    digits = space.digits.tolist()
+    sample = get_sample(space, 32)
+    rng = random.Random(nb_colors)
+    pairs = [
+        (rng.randrange(space.size), rng.randrange(space.size))
+        for _ in range(NB_SAMPLES)
+    ]
+    solver = EntropicSolver(cache_bytes=0)
+    solver.use_book = False
+    guess, _ = solver.find_best_guess(pool, nb_colors)
+    patterns = space.patterns([guess], pool)[0]
+    biggest_pattern = int(np.bincount(patterns).argmax())
+    sub_pool = pool[patterns == biggest_pattern]
+
+    def check_evaluate_pattern():
+        return all(
+            evaluate_pattern(digits[i], digits[j]) == space.evaluate(i, j)
+            for i, j in pairs
+        )
+
+    def check_pattern_matrix():
+        matrix = evaluate_pattern_matrix(space.digits, nb_colors=nb_colors)
+        return all(
+            matrix[i, j] == evaluate_pattern(digits[i], digits[j])
+            for i in sample
+            for j in pool
+        )
+
+    def check_entropies():
+        entropies = get_entropies(space.partition_counts(sample, pool), space.size)
+        pool_digits = space.digits[pool].tolist()
+        naive = [solver.expected_information(digits[i], pool_digits) for i in sample]
+        return bool(np.allclose(entropies, naive))
+
+    def filter_all():
+        mask = np.ones(space.size, dtype=bool)
+        return filter_pool_mask(mask, guess, biggest_pattern, space, pool)
+
+    def check_filter():
+        naive = [
+            code
+            for code in range(space.size)
+            if evaluate_pattern(digits[guess], digits[code]) == biggest_pattern
+        ]
+        return np.flatnonzero(filter_all()).tolist() == naive
+
+    def check_find_best_guess():
+        scores = solver.get_candidate_scores(sub_pool, sub_pool, nb_colors)
+        naive = [
+            solver.expected_information(digits[i], space.digits[sub_pool].tolist())
+            for i in sub_pool[:32]
+        ]
+        return bool(np.allclose(scores[:32], naive))
+
+    def solve_all_codes():
+        return EntropicSolver().solve_all_codes(nb_colors)
+
+    def check_solve_all_codes():
+        return all(guesses[-1] == secret for secret, guesses, _ in solve_all_codes())
+
+    return {
+        "evaluate_pattern": (
+            lambda: [evaluate_pattern(digits[i], digits[j]) for i, j in pairs],
+            check_evaluate_pattern,
+        ),
+        "evaluate_pattern_matrix": (
+            lambda: evaluate_pattern_matrix(space.digits, nb_colors=nb_colors),
+            check_pattern_matrix,
+        ),
+        "entropy_kernel": (
+            lambda: get_entropies(space.partition_counts(pool, pool), space.size),
+            check_entropies,
+        ),
+        "filter_pool_mask": (filter_all, check_filter),
+        "find_best_guess_turn_1": (
+            lambda: solver.find_best_guess(pool, nb_colors),
+            lambda: True,
+        ),
+        "find_best_guess_turn_2": (
+            lambda: solver.find_best_guess(sub_pool, nb_colors),
+            check_find_best_guess,
+        ),
+        "solve_all_codes": (solve_all_codes, check_solve_all_codes),
+    }
+
+
+def run_benchmarks(colors, repeats=5, names=None):
+    """Return the results of the benchmarks, by "name[nb_colors]" """
+    results = {}
+    for nb_colors in colors:
+        for name, (function, check) in get_benchmarks(nb_colors).items():
+            if names is not None and name not in names:
+                continue
+            result = measure(function, repeats)
+            result["check"] = check()
+            results[f"{name}[{nb_colors}]"] = result
+            print(
+                f"{name}[{nb_colors}] : median {result['median'] * 1000:.3f} ms, "
+                f"peak {result['peak_bytes'] / 2**20:.1f} MiB"
+                + ("" if result["check"] else ", CHECK FAILED"),
+                flush=True,
+            )
+    return results
+
+
+def get_metadata(repeats):
+    return {
+        "date": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "machine": platform.machine(),
+        "processor": platform.processor(),
+        "repeats": repeats,
+    }
+
+
+def compare_results(results, baseline, tolerance=0.2):
+    """Return the benchmarks slower than the baseline by more than tolerance
+    (relative, on the median), as {key: median / baseline median}"""
+    regressions = {}
+    for key, result in results.items():
+        if key not in baseline:
+            continue
+        ratio = result["median"] / baseline[key]["median"]
+        if ratio > 1 + tolerance:
+            regressions[key] = ratio
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--colors", nargs=2, type=int, default=[2, 8], metavar=("MIN", "MAX")
+    )
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--only", nargs="+", default=None, help="benchmark names")
+    parser.add_argument("--output", help="JSON file to write the results to")
+    parser.add_argument("--baseline", help="JSON file of results to compare with")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    args = parser.parse_args()
+    colors = range(args.colors[0], args.colors[1] + 1)
+    results = run_benchmarks(colors, args.repeats, args.only)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(
+                {"metadata": get_metadata(args.repeats), "results": results},
+                f,
+                indent=1,
+            )
+    failed = [key for key, result in results.items() if not result["check"]]
+    regressions = {}
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)["results"]
+        regressions = compare_results(results, baseline, args.tolerance)
+        for key, ratio in regressions.items():
+            print(f"REGRESSION {key} : {ratio:.2f} x baseline")
+        print(f"{len(regressions)} regressions (tolerance {args.tolerance:.0%})")
+    return 1 if failed or regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
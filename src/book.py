@@ -0,0 +1,101 @@
+import os
+import json
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+BOOK_VERSION = 1
+BOOK_DIR = os.environ.get(
+    "MASTERMIND_BOOK_DIR", os.path.join(os.path.dirname(__file__), "data", "books")
+)
+
+
+@contextmanager
+def file_lock(path):
+    """Hold an exclusive lock on path (created if needed) between processes"""
+    with open(path, "a+") as f:
+        if fcntl is not None:
+            fcntl.flock(f, fcntl.LOCK_EX)
+        else:
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_UN)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+def get_history_key(history):
+    """Key of a game state in a book : the (guess string, pattern) history,
+    like "CDEF:6,ABDE:10" ("" for the first guess)"""
+    return ",".join(f"{guess}:{pattern}" for guess, pattern in history)
+
+
+class OpeningBook:
+    """Guesses of one solver for the first plies of the games, precomputed since
+    they are the same in every game (see build_books.py).
+    The book is a JSON file per solver, in the book directory :
+    {"version": 1, "solver": name, "configs": {"pegs,colors": {"plies": N,
+    "entries": {history key: [guess string, expected information]}}}}
+    Files of another version are ignored. Writes go through a temporary file
+    renamed over the book, under a lock, so that processes can share a book."""
+
+    def __init__(self, name, book_dir=None):
+        self.name = name
+        self.book_dir = book_dir or BOOK_DIR
+        self.path = os.path.join(self.book_dir, f"{name}.json")
+        self._configs = None
+
+    @property
+    def configs(self):
+        if self._configs is None:
+            self._configs = self.read()
+        return self._configs
+
+    def read(self):
+        try:
+            with open(self.path, "r") as f:
+                book = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+        if book.get("version") != BOOK_VERSION:
+            return {}
+        return book["configs"]
+
+    def reload(self):
+        self._configs = None
+
+    def get_plies(self, nb_pegs, nb_colors):
+        """Number of plies covered for a configuration"""
+        return self.configs.get(f"{nb_pegs},{nb_colors}", {}).get("plies", 0)
+
+    def get(self, nb_pegs, nb_colors, history):
+        """Return (guess string, expected information) after the (guess string,
+        pattern) history, or None if it is not in the book"""
+        config = self.configs.get(f"{nb_pegs},{nb_colors}")
+        if config is None or len(history) >= config["plies"]:
+            return None
+        entry = config["entries"].get(get_history_key(history))
+        return None if entry is None else tuple(entry)
+
+    def update(self, nb_pegs, nb_colors, plies, entries):
+        """Replace the book of a configuration by the entries
+        {history key: (guess string, expected information)} of its first plies"""
+        os.makedirs(self.book_dir, exist_ok=True)
+        with file_lock(f"{self.path}.lock"):
+            configs = self.read()
+            configs[f"{nb_pegs},{nb_colors}"] = {"plies": plies, "entries": entries}
+            book = {"version": BOOK_VERSION, "solver": self.name, "configs": configs}
+            tmp_path = f"{self.path}.{os.getpid()}.tmp"
+            with open(tmp_path, "w") as f:
+                json.dump(book, f, indent=1, sort_keys=True)
+            os.replace(tmp_path, self.path)
+        self._configs = configs
@@ -0,0 +1,95 @@
+"""Precompute the opening books of the solvers (see book.py), one configuration
+per process, e.g. : python src/build_books.py --solvers entr entr-full --plies 2"""
+
+import time
+import argparse
+import multiprocessing as mp
+
+from book import BOOK_DIR, OpeningBook, get_history_key
+from solvers import EntropicSolver, ExpectedSizeSolver, MinimaxSolver, MostPartsSolver
+from utils import partition_pool
+
+BOOK_SOLVERS = {
+    "entr": lambda nb_pegs: EntropicSolver(nb_pegs),
+    "entr-full": lambda nb_pegs: EntropicSolver(nb_pegs, full_candidates=True),
+    "mini": lambda nb_pegs: MinimaxSolver(nb_pegs),
+    "mini-full": lambda nb_pegs: MinimaxSolver(nb_pegs, full_candidates=True),
+    "size": lambda nb_pegs: ExpectedSizeSolver(nb_pegs),
+    "size-full": lambda nb_pegs: ExpectedSizeSolver(nb_pegs, full_candidates=True),
+    "part": lambda nb_pegs: MostPartsSolver(nb_pegs),
+    "part-full": lambda nb_pegs: MostPartsSolver(nb_pegs, full_candidates=True),
+}
+
+
+def get_book_entries(solver, nb_colors, plies):
+    """Return the guesses of the solver for every history of less than plies guesses,
+    by history key (see book.get_history_key)"""
+    space = solver.get_code_space(nb_colors)
+    entries = {}
+
+    def add_entries(pool, history):
+        guess, information = solver.get_next_guess(pool, nb_colors, history=history)
+        key = get_history_key(
+            [(space.to_string(code), pattern) for code, pattern in history]
+        )
+        entries[key] = (space.to_string(guess), information)
+        if len(history) + 1 == plies:
+            return
+        for pattern, sub_pool in partition_pool(guess, pool, space).items():
+            if pattern != space.winning_pattern and len(sub_pool) < len(pool):
+                add_entries(sub_pool, history + [(guess, pattern)])
+
+    add_entries(space.all_codes(), [])
+    return entries
+
+
+def build_book(args):
+    """Task of a process : write the book of one solver for one configuration"""
+    name, nb_pegs, nb_colors, plies, book_dir = args
+    start = time.perf_counter()
+    solver = BOOK_SOLVERS[name](nb_pegs)
+    solver.use_book = False
+    entries = get_book_entries(solver, nb_colors, plies)
+    OpeningBook(name, book_dir).update(nb_pegs, nb_colors, plies, entries)
+    return name, nb_pegs, nb_colors, len(entries), time.perf_counter() - start
+
+
+def build_books(names, configs, plies, book_dir=None, processes=None):
+    """Build the books of the solvers for all the (nb_pegs, nb_colors) configurations,
+    biggest configurations first"""
+    tasks = [
+        (name, nb_pegs, nb_colors, plies, book_dir)
+        for nb_pegs, nb_colors in sorted(configs, key=lambda c: -c[1] ** c[0])
+        for name in names
+    ]
+    with mp.Pool(processes) as pool:
+        yield from pool.imap_unordered(build_book, tasks)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--solvers", nargs="+", default=["entr"], choices=BOOK_SOLVERS)
+    parser.add_argument("--pegs", nargs="+", type=int, default=[4])
+    parser.add_argument(
+        "--colors", nargs=2, type=int, default=[1, 8], metavar=("MIN", "MAX")
+    )
+    parser.add_argument("--plies", type=int, default=2)
+    parser.add_argument("--book-dir", default=BOOK_DIR)
+    parser.add_argument("--processes", type=int, default=None)
+    args = parser.parse_args()
+    configs = [
+        (nb_pegs, nb_colors)
+        for nb_pegs in args.pegs
+        for nb_colors in range(args.colors[0], args.colors[1] + 1)
+    ]
+    for name, nb_pegs, nb_colors, nb_entries, duration in build_books(
+        args.solvers, configs, args.plies, args.book_dir, args.processes
+    ):
+        print(
+            f"{name} {nb_pegs} pegs {nb_colors} colors : "
+            f"{nb_entries} guesses in {duration:.2f} s"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,223 @@
+import os
+import json
+import heapq
+import math
+from statistics import NormalDist
+
+from utils import get_code_space, log2
+
+# keys of a resultats.json file (see archives/data), lists indexed by nb_colors - 1
+RESULT_KEYS = (
+    "best_openers",
+    "average_nb_guess",
+    "information_to_get",
+    "information_per_guess_on_average",
+)
+
+
+class GameStats:
+    """Summary of the games of one configuration, fed one game at a time in
+    constant memory (whatever the number of games) : histogram of the number of
+    guesses, expected and actual information at each turn, first guesses, and the
+    nb_worst secrets needing the most guesses.
+    Games are (secret, guesses, entropy_values) results starting from all codes,
+    like the ones of MastermindSolver.solve, solve_all_codes or iter_games.
+    Without the sizes of the pool before each guess as a fourth item (see
+    iter_games), they are found again by filtering the code space."""
+
+    def __init__(self, nb_colors, nb_pegs=4, nb_worst=10):
+        self.space = get_code_space(nb_colors, nb_pegs)
+        self.nb_worst = nb_worst
+        self.nb_games = 0
+        # histogram[k] : number of games won with k guesses
+        self.histogram = [0]
+        # sums over the games still playing at each turn
+        self.nb_playing = []
+        self.expected_information = []
+        self.actual_information = []
+        self.openers = {}
+        # heap of the (nb_guesses, -secret) of the worst games
+        self.worst = []
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["space"] = (self.space.nb_colors, self.space.nb_pegs)
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.space = get_code_space(*self.space)
+
+    def add_game(self, secret, guesses, entropy_values, pool_sizes=None, count=1):
+        """Add a game, played count times (against the same secret)"""
+        space = self.space
+        nb_guesses = len(guesses)
+        self.nb_games += count
+        if nb_guesses >= len(self.histogram):
+            self.histogram.extend([0] * (nb_guesses + 1 - len(self.histogram)))
+        self.histogram[nb_guesses] += count
+        opener = space.to_string(guesses[0])
+        self.openers[opener] = self.openers.get(opener, 0) + count
+        if pool_sizes is None:
+            pool_sizes = self.get_pool_sizes(secret, guesses)
+        # the pool after the winning guess is the secret alone
+        pool_sizes = list(pool_sizes) + [1]
+        for turn, information in enumerate(entropy_values):
+            if turn == len(self.nb_playing):
+                self.nb_playing.append(0)
+                self.expected_information.append(0.0)
+                self.actual_information.append(0.0)
+            actual_information = log2(pool_sizes[turn] / pool_sizes[turn + 1])
+            self.nb_playing[turn] += count
+            self.expected_information[turn] += count * information
+            self.actual_information[turn] += count * actual_information
+        game = (nb_guesses, -int(secret))
+        if len(self.worst) < self.nb_worst:
+            heapq.heappush(self.worst, game)
+        elif game > self.worst[0]:
+            heapq.heapreplace(self.worst, game)
+
+    def get_pool_sizes(self, secret, guesses):
+        """Sizes of the pool before each guess of a game"""
+        space = self.space
+        pool = space.all_codes()
+        pool_sizes = []
+        for guess in guesses:
+            pool_sizes.append(len(pool))
+            pattern = space.evaluate(guess, secret)
+            pool = pool[space.patterns([guess], pool)[0] == pattern]
+        return pool_sizes
+
+    def add_games(self, games):
+        for game in games:
+            self.add_game(*game)
+        return self
+
+    def merge(self, other):
+        """Add the games of other, summarized in another process for instance"""
+        self.nb_games += other.nb_games
+        for name in ("histogram", "nb_playing"):
+            totals, values = getattr(self, name), getattr(other, name)
+            totals.extend([0] * (len(values) - len(totals)))
+            for i, value in enumerate(values):
+                totals[i] += value
+        for name in ("expected_information", "actual_information"):
+            totals, values = getattr(self, name), getattr(other, name)
+            totals.extend([0.0] * (len(values) - len(totals)))
+            for i, value in enumerate(values):
+                totals[i] += value
+        for opener, count in other.openers.items():
+            self.openers[opener] = self.openers.get(opener, 0) + count
+        for game in other.worst:
+            if len(self.worst) < self.nb_worst:
+                heapq.heappush(self.worst, game)
+            elif game > self.worst[0]:
+                heapq.heapreplace(self.worst, game)
+        return self
+
+    @property
+    def average_nb_guesses(self):
+        total = sum(k * count for k, count in enumerate(self.histogram))
+        return total / self.nb_games if self.nb_games else 0
+
+    @property
+    def variance_nb_guesses(self):
+        """Sample variance of the number of guesses"""
+        if self.nb_games < 2:
+            return 0.0
+        squares = sum(k * k * count for k, count in enumerate(self.histogram))
+        mean = self.average_nb_guesses
+        return max(0.0, squares - self.nb_games * mean**2) / (self.nb_games - 1)
+
+    def get_confidence_interval(self, confidence=0.95):
+        """Normal confidence interval of the average number of guesses
+        (when the games are played against random secrets)"""
+        z = NormalDist().inv_cdf((1 + confidence) / 2)
+        half_width = z * math.sqrt(self.variance_nb_guesses / max(1, self.nb_games))
+        average = self.average_nb_guesses
+        return average - half_width, average + half_width
+
+    @property
+    def max_nb_guesses(self):
+        return len(self.histogram) - 1
+
+    @property
+    def information_to_get(self):
+        """Information needed to find the secret among all codes, in bits"""
+        return log2(self.space.size)
+
+    @property
+    def information_per_guess(self):
+        average = self.average_nb_guesses
+        return self.information_to_get / average if average else 0
+
+    @property
+    def best_opener(self):
+        """Most played first guess"""
+        return max(self.openers, key=self.openers.get) if self.openers else ""
+
+    def get_worst_secrets(self):
+        """(secret, nb_guesses) of the worst games, the worst first"""
+        worst = sorted(self.worst, reverse=True)
+        return [(-secret, nb_guesses) for nb_guesses, secret in worst]
+
+    def get_turn_information(self):
+        """Average expected and actual information of each turn, in bits,
+        over the games still playing"""
+        return [
+            {
+                "turn": turn + 1,
+                "nb_games": nb_playing,
+                "expected": self.expected_information[turn] / nb_playing,
+                "actual": self.actual_information[turn] / nb_playing,
+            }
+            for turn, nb_playing in enumerate(self.nb_playing)
+        ]
+
+    def to_dict(self):
+        return {
+            "nb_colors": self.space.nb_colors,
+            "nb_pegs": self.space.nb_pegs,
+            "nb_games": self.nb_games,
+            "average_nb_guesses": self.average_nb_guesses,
+            "max_nb_guesses": self.max_nb_guesses,
+            "histogram": self.histogram,
+            "information_to_get": self.information_to_get,
+            "information_per_guess": self.information_per_guess,
+            "openers": self.openers,
+            "turns": self.get_turn_information(),
+            "worst_secrets": [
+                [self.space.to_string(secret), nb_guesses]
+                for secret, nb_guesses in self.get_worst_secrets()
+            ],
+        }
+
+
+def update_results(path, stats, suffix=""):
+    """Write the summaries of GameStats of several numbers of colors in a
+    resultats.json file, keeping its other values. With a suffix (e.g. "_minimax"),
+    the keys of another solver are written."""
+    results = {}
+    if os.path.exists(path):
+        with open(path) as f:
+            results = json.load(f)
+    for game_stats in stats:
+        i = game_stats.space.nb_colors - 1
+        values = {
+            "best_openers": game_stats.best_opener,
+            "average_nb_guess": round(game_stats.average_nb_guesses, 4),
+            "information_to_get": round(game_stats.information_to_get, 4),
+            "information_per_guess_on_average": round(
+                game_stats.information_per_guess, 4
+            ),
+        }
+        for key in RESULT_KEYS:
+            default = "" if key == "best_openers" else 0
+            column = results.setdefault(key + suffix, [])
+            column.extend([default] * (i + 1 - len(column)))
+            column[i] = values[key]
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(results, f)
+    os.replace(tmp_path, path)
+    return results
@@ -0,0 +1,245 @@
+"""Command line interface : python src/mastermind.py solve|play|bench ...
+
+Modules are loaded only when a command needs them : a guess found in the
+opening book is printed without importing NumPy or the solvers."""
+
+import sys
+import time
+import string
+import argparse
+import importlib
+
+from book import OpeningBook
+
+# alias -> (module, class)
+SOLVERS = {
+    "entr": ("solvers", "EntropicSolver"),
+    "mini": ("solvers", "MinimaxSolver"),
+    "size": ("solvers", "ExpectedSizeSolver"),
+    "part": ("solvers", "MostPartsSolver"),
+    "rand": ("solvers", "RandomSolver"),
+    "opti": ("optimal", "OptimalSolver"),
+}
+BOOK_SOLVERS = {"entr", "mini", "size", "part"}
+# solvers which can guess among all codes
+FULL_SOLVERS = {"entr", "mini", "size", "part", "opti"}
+# suffix of the keys of a solver in a resultats.json file
+RESULT_SUFFIXES = {"entr": "", "mini": "_minimax"}
+# letters of the colors (utils.COLORS, without importing NumPy)
+COLORS = string.ascii_uppercase
+
+
+def get_solver(args):
+    module, name = SOLVERS[args.solver]
+    solver_class = getattr(importlib.import_module(module), name)
+    if args.full:
+        return solver_class(args.pegs, full_candidates=True)
+    return solver_class(args.pegs)
+
+
+def get_book_name(args):
+    """Name of the opening book of the solver (see ScoringSolver.get_book_name)"""
+    if args.solver not in BOOK_SOLVERS:
+        return None
+    return f"{args.solver}-full" if args.full else args.solver
+
+
+def check_code(code, nb_pegs, nb_colors):
+    """Return the code in upper case, exiting if it is not a code of the game"""
+    code = code.upper()
+    colors = COLORS[:nb_colors]
+    if len(code) != nb_pegs or any(color not in colors for color in code):
+        raise SystemExit(
+            f"Bad code {code!r}, expected {nb_pegs} letters among {colors}"
+        )
+    return code
+
+
+def parse_history(history, nb_pegs, nb_colors):
+    """Read "GUESS:BW" items (B well placed, W misplaced) as (guess, pattern)"""
+    parsed = []
+    for item in history:
+        guess, _, feedback = item.upper().partition(":")
+        if len(feedback) != 2 or not feedback.isdigit():
+            raise SystemExit(f"Bad history item {item!r}, expected e.g. ABCD:21")
+        guess = check_code(guess, nb_pegs, nb_colors)
+        well_placed, misplaced = map(int, feedback)
+        if well_placed + misplaced > nb_pegs:
+            raise SystemExit(f"Bad feedback in {item!r}, at most {nb_pegs} pegs")
+        if well_placed == nb_pegs:
+            raise SystemExit(f"The game is already won by {guess}")
+        parsed.append((guess, (nb_pegs + 1) * well_placed + misplaced))
+    return parsed
+
+
+def solve(args):
+    """Print the next guess after the history"""
+    history = parse_history(args.history, args.pegs, args.colors)
+    name = get_book_name(args)
+    entry = None
+    if name is not None:
+        entry = OpeningBook(name, args.book_dir).get(args.pegs, args.colors, history)
+    if entry is None:
+        entry = find_next_guess(args, history)
+    guess, information = entry
+    print(f"{guess} ({information:.4f} bits)")
+
+
+def find_next_guess(args, history):
+    import numpy as np
+    from utils import filter_pool_mask
+
+    solver = get_solver(args)
+    solver.book_dir = args.book_dir
+    space = solver.get_code_space(args.colors)
+    history = [(space.from_string(guess), pattern) for guess, pattern in history]
+    pool_mask = np.ones(space.size, dtype=bool)
+    for guess, pattern in history:
+        filter_pool_mask(pool_mask, guess, pattern, space)
+    pool = np.flatnonzero(pool_mask)
+    if len(pool) == 0:
+        raise SystemExit("No code is consistent with this history")
+    guess, information = solver.get_next_guess(pool, args.colors, history=history)
+    return space.to_string(guess), information
+
+
+def play(args):
+    """Play against a given secret, or against the user giving the feedbacks"""
+    if args.secret is not None:
+        args.secret = check_code(args.secret, args.pegs, args.colors)
+    solver = get_solver(args)
+    solver.book_dir = args.book_dir
+    space = solver.get_code_space(args.colors)
+    if args.secret is None:
+        solver.solve(args.colors, alone=False)
+    else:
+        solver.solve(args.colors, secret=space.from_string(args.secret), debug=True)
+
+
+def bench(args):
+    """Play the games of all secret codes, or of random secrets until the average
+    number of guesses is known within --target"""
+    from game_stats import update_results
+
+    start = time.perf_counter()
+    solver = get_solver(args)
+    solver.book_dir = args.book_dir
+    collector = None
+    if args.metrics:
+        from metrics import MetricsCollector
+
+        collector = MetricsCollector()
+        solver.add_hook(collector)
+    loaded = time.perf_counter()
+    if args.target is None:
+        game_stats = solver.get_game_stats(args.colors, processes=args.processes)
+    else:
+        from monte_carlo import evaluate_solver
+
+        evaluation = evaluate_solver(
+            solver,
+            args.colors,
+            target=args.target,
+            processes=args.processes,
+            seed=args.seed,
+        )
+        game_stats = evaluation["stats"]
+    duration = time.perf_counter() - loaded
+    solver.close()
+    if collector is not None:
+        prometheus = args.metrics.endswith(".prom")
+        with open(args.metrics, "w") as f:
+            if prometheus:
+                f.write(collector.to_prometheus())
+            else:
+                f.write(collector.to_json_lines())
+    space = solver.get_code_space(args.colors)
+    print(f"{solver.name}, {args.pegs} pegs, {args.colors} colors")
+    print(space.describe_memory_plan())
+    print(f"Average number of guesses : {game_stats.average_nb_guesses:.4f}")
+    if args.target is not None:
+        low, high = game_stats.get_confidence_interval()
+        print(f"95% confidence interval : [{low:.4f}, {high:.4f}]")
+    print(f"Max number of guesses : {game_stats.max_nb_guesses}")
+    print(f"Number of games by number of guesses : {game_stats.histogram}")
+    worst = game_stats.get_worst_secrets()[:5]
+    print(f"Worst secrets : {space.to_strings(secret for secret, _ in worst)}")
+    print(f"Loading : {loaded - start:.3f} s")
+    nb_games = game_stats.nb_games
+    print(f"Games : {duration:.3f} s, {nb_games / duration:.0f} games/s")
+    if args.results:
+        suffix = RESULT_SUFFIXES.get(args.solver, f"_{args.solver}")
+        update_results(args.results, [game_stats], suffix + ("_full" * args.full))
+
+
+def get_int_argument(value, low, high=None):
+    """Read an integer argument between low and high, for argparse"""
+    if not value.lstrip("-").isdigit():
+        raise argparse.ArgumentTypeError(f"expected an integer, got {value!r}")
+    number = int(value)
+    if number < low or (high is not None and number > high):
+        bounds = f"at least {low}" if high is None else f"between {low} and {high}"
+        raise argparse.ArgumentTypeError(f"must be {bounds}")
+    return number
+
+
+def get_nb_colors(value):
+    return get_int_argument(value, 1, len(COLORS))
+
+
+def get_nb_pegs(value):
+    return get_int_argument(value, 1)
+
+
+def get_parser():
+    parser = argparse.ArgumentParser(prog="mastermind", description=__doc__)
+    commands = parser.add_subparsers(dest="command", required=True)
+    for name, command, help in [
+        ("solve", solve, "print the next guess"),
+        ("play", play, "play a game"),
+        ("bench", bench, "solve all secret codes"),
+    ]:
+        subparser = commands.add_parser(name, help=help)
+        subparser.set_defaults(command=command)
+        subparser.add_argument("--colors", type=get_nb_colors, default=6)
+        subparser.add_argument("--pegs", type=get_nb_pegs, default=4)
+        subparser.add_argument("--solver", choices=SOLVERS, default="entr")
+        subparser.add_argument(
+            "--full", action="store_true", help="guesses among all codes"
+        )
+        subparser.add_argument("--book-dir", default=None)
+    commands.choices["solve"].add_argument(
+        "history", nargs="*", help="guesses played so far, e.g. ABCD:21"
+    )
+    commands.choices["play"].add_argument(
+        "--secret", help="secret code, else you give the feedbacks"
+    )
+    commands.choices["bench"].add_argument("--processes", type=int, default=None)
+    commands.choices["bench"].add_argument(
+        "--results", help="resultats.json file to write the averages to"
+    )
+    commands.choices["bench"].add_argument(
+        "--target",
+        type=float,
+        help="play random secrets until the 95%% confidence interval of the "
+        "average is within this distance of it",
+    )
+    commands.choices["bench"].add_argument("--seed", type=int, default=0)
+    commands.choices["bench"].add_argument(
+        "--metrics",
+        help="file to write the metrics of each turn to, in Prometheus text "
+        "format if it ends with .prom, else in JSON lines",
+    )
+    return parser
+
+
+def main(argv=None):
+    parser = get_parser()
+    args = parser.parse_args(argv)
+    if args.full and args.solver not in FULL_SOLVERS:
+        parser.error(f"the solver {args.solver} cannot guess among all codes")
+    args.command(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
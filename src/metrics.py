@@ -0,0 +1,154 @@
+import json
+import time
+import tracemalloc
+from collections import defaultdict
+
+# stages of a turn, in order
+STAGES = ("matrix", "scoring", "filtering")
+
+
+class SolverHook:
+    """Base class of the hooks called by a solver on each turn (see
+    MastermindSolver.add_hook). In batched runs, a turn is one guess played for
+    a group of games sharing the same history. Hooks only see the turns played
+    in the process of the solver, not in its worker processes."""
+
+    def on_turn_start(self, turn):
+        pass
+
+    def on_turn_end(self, turn):
+        pass
+
+
+class Turn:
+    """Metrics of one turn : the seconds spent in each stage are added by mark(),
+    the time spent loading the pattern matrix meanwhile going to the matrix stage.
+    Cache hits and misses are counted between the start and end()"""
+
+    def __init__(self, solver, space, pool, number, nb_games=1):
+        self.hooks = solver.hooks
+        self.cache = solver.cache
+        self.solver = solver.alias
+        self.nb_pegs = space.nb_pegs
+        self.nb_colors = space.nb_colors
+        self.space = space
+        self.load_seconds = space.load_seconds
+        self.number = number
+        self.pool_size = len(pool)
+        self.nb_games = nb_games
+        self.guess = None
+        self.error_bound = None
+        self.seconds = dict.fromkeys(STAGES, 0.0)
+        self.cache_hits = self.cache.hits if self.cache is not None else 0
+        self.cache_misses = self.cache.misses if self.cache is not None else 0
+        self.allocated_bytes = None
+        for hook in self.hooks:
+            hook.on_turn_start(self)
+        self.last_time = time.perf_counter()
+
+    def mark(self, stage):
+        """Add the time since the last mark to a stage
+        (or discard it if stage is None, e.g. while waiting for a feedback)"""
+        now = time.perf_counter()
+        loading = self.space.load_seconds - self.load_seconds
+        if stage is not None:
+            self.seconds["matrix"] += loading
+            self.seconds[stage] += now - self.last_time - loading
+        self.load_seconds = self.space.load_seconds
+        self.last_time = now
+
+    def end(self, guess, error_bound=None):
+        """End the turn, error_bound being the one of an approximate search of the
+        guess (see EntropicSolver.sample_size)"""
+        self.guess = int(guess)
+        self.error_bound = error_bound
+        if self.cache is not None:
+            self.cache_hits = self.cache.hits - self.cache_hits
+            self.cache_misses = self.cache.misses - self.cache_misses
+        for hook in self.hooks:
+            hook.on_turn_end(self)
+
+    def to_dict(self):
+        return {
+            "solver": self.solver,
+            "nb_pegs": self.nb_pegs,
+            "nb_colors": self.nb_colors,
+            "turn": self.number,
+            "pool_size": self.pool_size,
+            "nb_games": self.nb_games,
+            "guess": self.guess,
+            "error_bound": self.error_bound,
+            **{f"{stage}_seconds": seconds for stage, seconds in self.seconds.items()},
+            "cache_hits": self.cache_hits,
+            "cache_misses": self.cache_misses,
+            "allocated_bytes": self.allocated_bytes,
+        }
+
+
+class MetricsCollector(SolverHook):
+    """Record the metrics of every turn. With trace_memory, the peak of the memory
+    allocated during each turn is measured with tracemalloc (which slows down
+    allocations while it is tracing)."""
+
+    def __init__(self, trace_memory=False):
+        self.trace_memory = trace_memory
+        self.turns = []
+        self.start_bytes = 0
+        self.started_tracing = False
+
+    def on_turn_start(self, turn):
+        if self.trace_memory:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+                self.started_tracing = True
+            tracemalloc.reset_peak()
+            self.start_bytes, _ = tracemalloc.get_traced_memory()
+
+    def on_turn_end(self, turn):
+        if self.trace_memory:
+            _, peak_bytes = tracemalloc.get_traced_memory()
+            turn.allocated_bytes = peak_bytes - self.start_bytes
+        self.turns.append(turn.to_dict())
+
+    def clear(self):
+        self.turns = []
+
+    def close(self):
+        """Stop tracing memory allocations, if the collector started it"""
+        if self.started_tracing:
+            tracemalloc.stop()
+            self.started_tracing = False
+
+    def to_json_lines(self):
+        return "".join(json.dumps(turn) + "\n" for turn in self.turns)
+
+    def to_prometheus(self):
+        """Totals by solver, configuration and turn number, in Prometheus text format"""
+        totals = defaultdict(lambda: defaultdict(float))
+        for turn in self.turns:
+            labels = (
+                f'solver="{turn["solver"]}",pegs="{turn["nb_pegs"]}",'
+                f'colors="{turn["nb_colors"]}",turn="{turn["turn"]}"'
+            )
+            totals["mastermind_turns_total"][labels] += 1
+            totals["mastermind_games_total"][labels] += turn["nb_games"]
+            totals["mastermind_pool_size_total"][labels] += turn["pool_size"]
+            for stage in STAGES:
+                stage_labels = f'{labels},stage="{stage}"'
+                seconds = turn[f"{stage}_seconds"]
+                totals["mastermind_turn_seconds_total"][stage_labels] += seconds
+            totals["mastermind_cache_hits_total"][labels] += turn["cache_hits"]
+            totals["mastermind_cache_misses_total"][labels] += turn["cache_misses"]
+            if turn["error_bound"] is not None:
+                error_bound = turn["error_bound"]
+                totals["mastermind_error_bound_bits_total"][labels] += error_bound
+            if turn["allocated_bytes"] is not None:
+                allocated_bytes = turn["allocated_bytes"]
+                totals["mastermind_allocated_bytes_total"][labels] += allocated_bytes
+        lines = []
+        for name, values in totals.items():
+            lines.append(f"# TYPE {name} counter")
+            lines.extend(
+                f"{name}{{{labels}}} {value:.10g}" for labels, value in values.items()
+            )
+        return "\n".join(lines) + "\n"
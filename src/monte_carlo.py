@@ -0,0 +1,80 @@
+import time
+import random
+from collections import deque
+
+import numpy as np
+
+from game_stats import GameStats
+from workers import play_sample, play_sample_games
+
+
+def evaluate_solver(
+    solver,
+    nb_colors,
+    target=0.01,
+    confidence=0.95,
+    batch_size=256,
+    min_games=1024,
+    max_games=10**6,
+    processes=None,
+    seed=0,
+):
+    """Estimate the average number of guesses of the solver on random secrets,
+    playing batches of batch_size games until the confidence interval of the
+    average is at most target wide on each side (or max_games are played, the
+    last batch being cut short).
+    Batch k draws its secrets from the k-th stream spawned from
+    numpy.random.SeedSequence(seed), and batches are counted in order, so the
+    result only depends on seed and batch_size, not on the number of processes.
+    Batches still running in the worker processes at the end are waited for,
+    and not counted. The state of the random module is kept.
+    Return a dict with the GameStats of the games, the interval and the
+    number of games played per second."""
+    root = np.random.SeedSequence(seed)
+    game_stats = GameStats(nb_colors, solver.nb_pegs)
+    start = time.perf_counter()
+    nb_submitted = 0
+
+    def is_done():
+        low, high = game_stats.get_confidence_interval(confidence)
+        if game_stats.nb_games >= max_games:
+            return True
+        return game_stats.nb_games >= min_games and (high - low) / 2 <= target
+
+    def next_batch():
+        nonlocal nb_submitted
+        nb_games = min(batch_size, max_games - nb_submitted)
+        nb_submitted += nb_games
+        return nb_games, root.spawn(1)[0]
+
+    if processes is not None and processes > 1:
+        worker_pool = solver.get_worker_pool(processes)
+        handle = worker_pool.get_matrix_handle(solver.get_code_space(nb_colors))
+        pending = deque()
+        while not is_done():
+            # keep every worker busy, results being merged in order
+            while len(pending) < 2 * processes and nb_submitted < max_games:
+                task = (nb_colors, *next_batch(), handle)
+                pending.append(worker_pool.pool.apply_async(play_sample, (task,)))
+            game_stats.merge(pending.popleft().get())
+        # the pool of the solver is free for its next tasks
+        for result in pending:
+            result.wait()
+    else:
+        random_state = random.getstate()
+        try:
+            while not is_done():
+                batch = next_batch()
+                game_stats.merge(play_sample_games(solver, nb_colors, *batch))
+        finally:
+            random.setstate(random_state)
+    seconds = time.perf_counter() - start
+    low, high = game_stats.get_confidence_interval(confidence)
+    return {
+        "stats": game_stats,
+        "average_nb_guesses": game_stats.average_nb_guesses,
+        "confidence_interval": (low, high),
+        "nb_games": game_stats.nb_games,
+        "seconds": seconds,
+        "games_per_second": game_stats.nb_games / seconds,
+    }
@@ -0,0 +1,125 @@
+import numpy as np
+
+from solvers import MastermindSolver
+from strategy import StrategyTree
+from symmetry import SymmetryGroup
+from utils import get_entropies, get_pool_fingerprint, partition_pool
+
+
+def get_lower_bounds(size, nb_branches):
+    """Return lower_bounds[n] : the minimal total number of guesses needed to find
+    n secrets. Each guess finds at most one secret and splits the others in at most
+    nb_branches groups, so at most nb_branches**(d - 1) secrets are found at guess d."""
+    lower_bounds = np.zeros(size + 1, dtype=np.int64)
+    depth, capacity, found = 1, 1, 0
+    for n in range(1, size + 1):
+        if found == capacity:
+            depth += 1
+            capacity *= nb_branches
+            found = 0
+        found += 1
+        lower_bounds[n] = lower_bounds[n - 1] + depth
+    return lower_bounds
+
+
+class OptimalSolver(MastermindSolver):
+    """A Mastermind solver minimizing the expected number of guesses, by a depth
+    first branch and bound search of the game tree.
+    The cost of a pool is the total number of guesses needed to find each of its
+    codes. Candidates are explored by decreasing entropy and skipped when a lower
+    bound of their cost (from the sizes of the groups they split the pool into)
+    cannot beat the best strategy found so far. Exact costs and failed bounds are
+    kept in a transposition table keyed by the fingerprint of the pool."""
+
+    def __init__(self, nb_pegs=4, full_candidates=False, symmetry=True):
+        super().__init__("Optimal Solver", "opti", nb_pegs)
+        self.full_candidates = full_candidates
+        self.symmetry = symmetry
+        # fingerprint -> (lower bound, best guess or None, cost or None)
+        self.table = {}
+        self.lower_bounds = {}
+        self.nb_nodes = 0
+
+    def get_lower_bounds(self, space):
+        if space.size not in self.lower_bounds:
+            # all feedbacks but the winning one and (nb_pegs - 1) well placed, 1 misplaced
+            nb_branches = (space.nb_pegs + 1) * (space.nb_pegs + 2) // 2 - 2
+            self.lower_bounds[space.size] = get_lower_bounds(space.size, nb_branches)
+        return self.lower_bounds[space.size]
+
+    def get_candidates(self, space, pool, history):
+        candidates = space.all_codes() if self.full_candidates else pool
+        if self.symmetry and history is not None:
+            group = SymmetryGroup(space, [guess for guess, _ in history])
+            if not group.is_trivial:
+                candidates = group.representatives(candidates)
+        return candidates
+
+    def search(self, space, pool, history, limit):
+        """Return (cost, guess) of the best strategy for the pool if its cost is
+        below limit, else None"""
+        n = len(pool)
+        if n <= 2:
+            cost = 2 * n - 1
+            return (cost, int(pool[0])) if cost < limit else None
+        key = (space.nb_colors, get_pool_fingerprint(pool))
+        lower_bound, guess, cost = self.table.get(key, (0, None, None))
+        if cost is not None:
+            return (cost, guess) if cost < limit else None
+        if lower_bound >= limit:
+            return None
+        self.nb_nodes += 1
+
+        lower_bounds = self.get_lower_bounds(space)
+        candidates = self.get_candidates(space, pool, history)
+        counts = space.partition_counts(candidates, pool)
+        entropies = get_entropies(counts, n)
+        counts[:, space.winning_pattern] = 0
+        bounds = n + lower_bounds[counts].sum(axis=1)
+        # a guess giving the same feedback for the whole pool is useless
+        bounds[counts.max(axis=1) == n] = np.iinfo(np.int64).max
+        best_cost, best_guess = limit, None
+        for i in np.lexsort((-entropies, bounds)):
+            if bounds[i] >= best_cost:
+                break
+            candidate = int(candidates[i])
+            cost = bounds[i]
+            sub_pools = partition_pool(candidate, pool, space)
+            sub_pools.pop(space.winning_pattern, None)
+            for pattern in sorted(sub_pools, key=lambda p: -len(sub_pools[p])):
+                sub_pool = sub_pools[pattern]
+                sub_lower_bound = lower_bounds[len(sub_pool)]
+                result = self.search(
+                    space,
+                    sub_pool,
+                    None if history is None else history + [(candidate, pattern)],
+                    best_cost - cost + sub_lower_bound,
+                )
+                if result is None:
+                    break
+                cost += result[0] - sub_lower_bound
+            else:
+                best_cost, best_guess = cost, candidate
+        if best_guess is None:
+            self.table[key] = (max(lower_bound, limit), None, None)
+            return None
+        self.table[key] = (best_cost, best_guess, int(best_cost))
+        return int(best_cost), best_guess
+
+    def get_next_guess(self, pool, nb_colors, parallel=True, history=None):
+        space = self.get_code_space(nb_colors)
+        if history is None and len(pool) == space.size:
+            history = []
+        _, guess = self.search(space, pool, history, np.inf)
+        entropy = get_entropies(space.partition_counts([guess], pool), len(pool))[0]
+        return guess, float(entropy)
+
+    def get_expected_nb_guesses(self, nb_colors):
+        """Optimal average number of guesses over all secret codes"""
+        space = self.get_code_space(nb_colors)
+        cost, _ = self.search(space, space.all_codes(), [], np.inf)
+        return cost / space.size
+
+    def build_strategy_tree(self, nb_colors):
+        """Return the optimal strategy as a StrategyTree, which TreeSolver can replay"""
+        return StrategyTree.build(self, nb_colors)
@@ -0,0 +1,66 @@
+import numpy as np
+
+from utils import get_entropies
+
+# A scorer takes the (candidates, nb_patterns) partition counts of the candidate
+# guesses against a pool of n codes, and returns one score per candidate
+# (the higher the better).
+
+
+def entropy_score(counts, n):
+    """Expected information of the feedback, in bits"""
+    return get_entropies(counts, n)
+
+
+def minimax_score(counts, n):
+    """Knuth : minus the size of the biggest group left"""
+    return -counts.max(axis=1).astype(np.float64)
+
+
+def expected_size_score(counts, n):
+    """Minus the expected number of codes left"""
+    return -(counts.astype(np.float64) ** 2).sum(axis=1) / n
+
+
+def most_parts_score(counts, n):
+    """Number of different feedbacks"""
+    return np.count_nonzero(counts, axis=1).astype(np.float64)
+
+
+SCORERS = {
+    "entropy": entropy_score,
+    "minimax": minimax_score,
+    "expected_size": expected_size_score,
+    "most_parts": most_parts_score,
+}
+
+
+def score_candidates(space, candidates, pool, scorers):
+    """Return the scores of the candidates against the pool for each scorer
+    (a dict name -> scorer). Partition counts are computed only once, streamed
+    by blocks of candidates, and given to every scorer."""
+    scores = {name: np.empty(len(candidates)) for name in scorers}
+    for start, counts in space.iter_partition_counts(candidates, pool):
+        for name, scorer in scorers.items():
+            scores[name][start : start + len(counts)] = scorer(counts, len(pool))
+    return scores
+
+
+def choose_best_guess(candidates, scores, pool):
+    """Return the candidate with the best score and this score,
+    preferring codes of the pool on ties"""
+    best_score = scores.max()
+    ties = candidates[scores >= best_score - 1e-12]
+    consistent = ties[np.isin(ties, pool)]
+    best_guess = consistent[0] if len(consistent) else ties[0]
+    return int(best_guess), float(best_score)
+
+
+def compare_scorers(space, pool, scorers=SCORERS, candidates=None):
+    """Return the best guess and its score for each scorer, counting partitions once.
+    candidates default to the pool"""
+    candidates = pool if candidates is None else candidates
+    scores = score_candidates(space, candidates, pool, scorers)
+    return {
+        name: choose_best_guess(candidates, scores[name], pool) for name in scorers
+    }
@@ -0,0 +1,303 @@
+"""Local game server : python src/server.py --port 8765
+
+Clients send one JSON request per line and get one JSON response per line.
+All games share one solver, so its guess cache and the pattern matrices of
+the code spaces are shared too. Requests :
+    {"op": "new", "colors": 6}                        -> first guess
+    {"op": "feedback", "session": id, "feedback": [2, 1]} -> next guess or won
+    {"op": "state", "session": id}                    -> state (GameSession.to_state)
+    {"op": "resume", "state": state}                  -> new session, next guess
+    {"op": "close", "session": id}
+    {"op": "stats"}                                   -> sessions, latencies, cache
+Guesses are {"session": id, "guess": "ABCD", "information": bits, "remaining": n},
+errors are {"error": message}."""
+
+import sys
+import json
+import time
+import uuid
+import asyncio
+import argparse
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from session import GameSession
+from solvers import EntropicSolver
+from utils import COLORS
+
+PERCENTILES = (50, 90, 99)
+# longest request line, a state holding the mask of all the codes
+MAX_LINE_BYTES = 2**22
+
+
+class ServerSession:
+    """A game of the server, with the lock serializing its requests"""
+
+    def __init__(self, game):
+        self.game = game
+        self.lock = asyncio.Lock()
+        self.last_used = time.monotonic()
+
+
+class GameServer:
+    """Host many games on one solver. The guesses are computed in a pool of
+    max_workers threads so that the event loop never waits for them; at most
+    max_waiting requests can wait for a thread, the others are rejected before
+    changing their game, so they can be sent again.
+    Games have at most max_colors colors.
+    Sessions unused for idle_timeout seconds are deleted."""
+
+    def __init__(
+        self,
+        solver,
+        max_sessions=10000,
+        idle_timeout=600,
+        max_workers=None,
+        max_waiting=1000,
+        latency_samples=10000,
+        max_colors=10,
+    ):
+        self.solver = solver
+        self.max_colors = min(max_colors, len(COLORS))
+        self.max_sessions = max_sessions
+        self.idle_timeout = idle_timeout
+        self.max_waiting = max_waiting
+        self.executor = ThreadPoolExecutor(max_workers)
+        self.sessions = {}
+        self.nb_waiting = 0
+        self.nb_evicted = 0
+        self.latency_samples = latency_samples
+        self.latencies = {}
+        self.server = None
+        self.eviction_task = None
+
+    @staticmethod
+    def play_turn(game, pattern):
+        """Give the feedback pattern of the pending guess (if any) and return the
+        next guess, or None if the game is won"""
+        if pattern is not None:
+            game.give_feedback(pattern)
+        return None if game.won else game.next_guess()
+
+    async def get_next_guess(self, session_id, session, pattern=None):
+        """Play the feedback pattern (if any) and compute the next guess in the
+        thread pool, as filtering may load the pattern matrix. An overloaded server
+        rejects the request before changing the game, unless the feedback wins."""
+        game = session.game
+        if pattern is None and game.won:
+            nb_guesses = len(game.history)
+            return {"session": session_id, "won": True, "nb_guesses": nb_guesses}
+        if pattern != game.space.winning_pattern:
+            self.check_load()
+        self.nb_waiting += 1
+        try:
+            loop = asyncio.get_running_loop()
+            result = await loop.run_in_executor(
+                self.executor, self.play_turn, game, pattern
+            )
+        finally:
+            self.nb_waiting -= 1
+        if result is None:
+            nb_guesses = len(game.history)
+            return {"session": session_id, "won": True, "nb_guesses": nb_guesses}
+        guess, information = result
+        return {
+            "session": session_id,
+            "guess": game.space.to_string(guess),
+            "information": information,
+            "remaining": len(game.pool),
+        }
+
+    def check_load(self):
+        if self.nb_waiting >= self.max_waiting:
+            raise ValueError("Server overloaded, try again later")
+
+    def check_colors(self, nb_colors):
+        if not 1 <= nb_colors <= self.max_colors:
+            raise ValueError(f"The number of colors must be 1 to {self.max_colors}")
+        return nb_colors
+
+    async def start_session(self, game):
+        """Add a session for the game and return its first guess.
+        The session is deleted if the guess cannot be computed."""
+        if len(self.sessions) >= self.max_sessions:
+            raise ValueError("Too many sessions")
+        session_id = uuid.uuid4().hex
+        session = self.sessions[session_id] = ServerSession(game)
+        try:
+            async with session.lock:
+                return await self.get_next_guess(session_id, session)
+        except BaseException:
+            self.sessions.pop(session_id, None)
+            raise
+
+    def get_session(self, request):
+        session = self.sessions.get(request.get("session"))
+        if session is None:
+            raise ValueError("Unknown session")
+        session.last_used = time.monotonic()
+        return session
+
+    async def new(self, request):
+        nb_colors = self.check_colors(int(request["colors"]))
+        return await self.start_session(GameSession(self.solver, nb_colors))
+
+    async def feedback(self, request):
+        session = self.get_session(request)
+        well_placed, misplaced = map(int, request["feedback"])
+        nb_pegs = self.solver.nb_pegs
+        if min(well_placed, misplaced) < 0 or well_placed + misplaced > nb_pegs:
+            raise ValueError(f"Bad feedback {request['feedback']}")
+        pattern = (nb_pegs + 1) * well_placed + misplaced
+        async with session.lock:
+            return await self.get_next_guess(request["session"], session, pattern)
+
+    async def state(self, request):
+        session = self.get_session(request)
+        return {"session": request["session"], "state": session.game.to_state()}
+
+    async def resume(self, request):
+        self.check_colors(int(request["state"]["nb_colors"]))
+        game = GameSession.from_state(self.solver, request["state"])
+        return await self.start_session(game)
+
+    async def close(self, request):
+        self.get_session(request)
+        del self.sessions[request["session"]]
+        return {"session": request["session"], "closed": True}
+
+    async def stats(self, request):
+        cache = self.solver.cache
+        return {
+            "sessions": len(self.sessions),
+            "evicted": self.nb_evicted,
+            "waiting": self.nb_waiting,
+            "latencies": self.get_latency_percentiles(),
+            "cache": cache.get_stats() if cache is not None else None,
+        }
+
+    def record_latency(self, op, seconds):
+        if op not in self.latencies:
+            self.latencies[op] = deque(maxlen=self.latency_samples)
+        self.latencies[op].append(seconds)
+
+    def get_latency_percentiles(self):
+        """Percentiles of the latencies of the last requests of each op, in ms"""
+        percentiles = {}
+        for op, latencies in self.latencies.items():
+            latencies = sorted(latencies)
+            percentiles[op] = {"count": len(latencies)}
+            for q in PERCENTILES:
+                index = min(len(latencies) - 1, q * len(latencies) // 100)
+                percentiles[op][f"p{q}"] = latencies[index] * 1000
+        return percentiles
+
+    async def handle_request(self, line):
+        start = time.perf_counter()
+        op = None
+        try:
+            request = json.loads(line)
+            op = request.get("op")
+            if op not in OPS:
+                raise ValueError(f"Unknown op {op!r}")
+            response = await OPS[op](self, request)
+        except (ValueError, KeyError, TypeError) as error:
+            response = {"error": str(error) or type(error).__name__}
+        if op in OPS:
+            self.record_latency(op, time.perf_counter() - start)
+        return response
+
+    async def handle_client(self, reader, writer):
+        """Answer the requests of a connection one at a time : a client sending
+        faster than it is answered is slowed down by the TCP flow control"""
+        try:
+            while line := await reader.readline():
+                response = await self.handle_request(line)
+                writer.write(json.dumps(response).encode() + b"\n")
+                await writer.drain()
+        except ValueError:
+            # line longer than MAX_LINE_BYTES : the stream cannot be read further
+            writer.write(json.dumps({"error": "Request too long"}).encode() + b"\n")
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    def evict_idle_sessions(self):
+        now = time.monotonic()
+        for session_id, session in list(self.sessions.items()):
+            idle = now - session.last_used > self.idle_timeout
+            if idle and not session.lock.locked():
+                del self.sessions[session_id]
+                self.nb_evicted += 1
+
+    async def run_eviction(self):
+        while True:
+            await asyncio.sleep(min(self.idle_timeout, 60))
+            self.evict_idle_sessions()
+
+    async def start(self, host="127.0.0.1", port=8765):
+        self.server = await asyncio.start_server(
+            self.handle_client, host, port, limit=MAX_LINE_BYTES
+        )
+        self.eviction_task = asyncio.create_task(self.run_eviction())
+        return self.server
+
+    async def stop(self):
+        self.eviction_task.cancel()
+        self.server.close()
+        await self.server.wait_closed()
+        self.executor.shutdown()
+
+
+OPS = {
+    "new": GameServer.new,
+    "feedback": GameServer.feedback,
+    "state": GameServer.state,
+    "resume": GameServer.resume,
+    "close": GameServer.close,
+    "stats": GameServer.stats,
+}
+
+
+async def serve(args):
+    solver = EntropicSolver(args.pegs, full_candidates=args.full)
+    for nb_colors in args.preload:
+        solver.get_code_space(nb_colors).pattern_matrix
+    server = GameServer(
+        solver,
+        max_sessions=args.max_sessions,
+        idle_timeout=args.idle_timeout,
+        max_workers=args.workers,
+        max_colors=args.max_colors,
+    )
+    await server.start(args.host, args.port)
+    print(f"Serving on {args.host}:{args.port}", flush=True)
+    async with server.server:
+        await server.server.serve_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--pegs", type=int, default=4)
+    parser.add_argument("--full", action="store_true", help="guesses among all codes")
+    parser.add_argument(
+        "--preload", nargs="*", type=int, default=[], help="numbers of colors"
+    )
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--max-colors", type=int, default=10)
+    parser.add_argument("--max-sessions", type=int, default=10000)
+    parser.add_argument("--idle-timeout", type=float, default=600)
+    args = parser.parse_args()
+    try:
+        asyncio.run(serve(args))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,106 @@
+import base64
+
+import numpy as np
+
+from utils import filter_pool_mask
+
+
+class GameSession:
+    """One game played step by step by a solver, the caller giving the feedbacks.
+
+        session = GameSession(solver, nb_colors)
+        game = session.play()
+        guess, information = next(game)
+        guess, information = game.send(pattern)  # ... until StopIteration (won)
+
+    The state of the game is the (guess, pattern) history and the boolean mask of
+    the codes still possible : to_state() gives it as a small JSON-compatible dict,
+    from_state() resumes the game, so many sessions can be suspended and resumed
+    in one process. The solver gets the history only if the game started from the
+    whole code space, as its pool is then exactly the codes consistent with it."""
+
+    def __init__(self, solver, nb_colors, pool=None):
+        self.solver = solver
+        self.nb_colors = nb_colors
+        self.space = solver.get_code_space(nb_colors)
+        self.pool_mask = np.zeros(self.space.size, dtype=bool)
+        self.pool_mask[self.space.all_codes() if pool is None else pool] = True
+        self.history = []
+        self.exact_history = bool(self.pool_mask.all())
+        self.won = False
+        # (guess, information) waiting for its feedback
+        self.pending = None
+        self._pool = None
+
+    @property
+    def pool(self):
+        """Codes still possible, as an array of indices"""
+        if self._pool is None:
+            self._pool = np.flatnonzero(self.pool_mask)
+        return self._pool
+
+    def next_guess(self, parallel=True):
+        """Return (guess, expected information) of the next guess to play"""
+        if self.won:
+            raise ValueError("The game is over")
+        if self.pending is None:
+            self.pending = self.solver.get_next_guess(
+                self.pool,
+                self.nb_colors,
+                parallel=parallel,
+                history=self.history if self.exact_history else None,
+            )
+        return self.pending
+
+    def give_feedback(self, pattern):
+        """Play the pending guess with its feedback pattern.
+        Return the number of codes still possible."""
+        if self.pending is None:
+            raise ValueError("There is no guess waiting for a feedback")
+        guess, _ = self.pending
+        pool = self.pool
+        filter_pool_mask(self.pool_mask, guess, pattern, self.space, pool)
+        won = pattern == self.space.winning_pattern
+        if not won and not self.pool_mask.any():
+            # the codes of the pool were all possible before the feedback
+            self.pool_mask[pool] = True
+            raise ValueError(f"No code is consistent with the feedback {pattern}")
+        self._pool = None
+        self.history.append((guess, pattern))
+        self.pending = None
+        self.won = won
+        return len(self.pool)
+
+    def play(self, parallel=True):
+        """Generator yielding (guess, expected information) and receiving the
+        feedback pattern of the guess through send(), until the game is won"""
+        while not self.won:
+            pattern = yield self.next_guess(parallel)
+            if pattern is None:
+                raise ValueError("Send the feedback pattern of the guess")
+            self.give_feedback(pattern)
+
+    def to_state(self):
+        return {
+            "nb_colors": self.nb_colors,
+            "nb_pegs": self.space.nb_pegs,
+            "history": [[int(guess), int(pattern)] for guess, pattern in self.history],
+            "exact_history": self.exact_history,
+            "won": self.won,
+            "pool_mask": base64.b64encode(np.packbits(self.pool_mask)).decode(),
+        }
+
+    @classmethod
+    def from_state(cls, solver, state):
+        """Resume a game saved by to_state"""
+        if state["nb_pegs"] != solver.nb_pegs:
+            raise ValueError(f"The game has {state['nb_pegs']} pegs")
+        session = cls(solver, state["nb_colors"])
+        packed = np.frombuffer(base64.b64decode(state["pool_mask"]), dtype=np.uint8)
+        session.pool_mask = np.unpackbits(packed, count=session.space.size).astype(bool)
+        session.history = [tuple(item) for item in state["history"]]
+        session.exact_history = state["exact_history"]
+        session.won = state["won"]
+        if not session.won and not session.pool_mask.any():
+            raise ValueError("No code is possible in this state")
+        return session
@@ -1,97 +1,316 @@
 import random
-import json
+import warnings
 from abc import ABC, abstractmethod
+from statistics import NormalDist
 
 import numpy as np
-import scipy.stats as stats
+from book import OpeningBook
+from game_stats import GameStats
+from metrics import Turn
+from session import GameSession
+from symmetry import SymmetryGroup
+from workers import WorkerPool
+from scoring import (
+    choose_best_guess,
+    entropy_score,
+    expected_size_score,
+    minimax_score,
+    most_parts_score,
+    score_candidates,
+)
 from utils import (
     log2,
-    get_all_codes,
-    get_all_codes_matching_pattern,
+    get_code_space,
     pattern_int_to_list,
     evaluate_pattern,
     get_clean_feedback,
-    evaluate_pattern_matrix,
+    get_nb_patterns,
+    get_partition_counts,
+    get_entropies,
+    get_entropy_bounds,
+    get_pool_fingerprint,
+    GuessCache,
 )
 
 
 class MastermindSolver(ABC):
     """Abstract class for a Mastermind solver"""
 
-    def __init__(self, name, alias):
+    def __init__(self, name, alias, nb_pegs=4, cache_bytes=0):
         self.name = name
         self.alias = alias
+        self.nb_pegs = nb_pegs
+        self.cache = GuessCache(cache_bytes) if cache_bytes else None
+        self.worker_pool = None
+        # opening book, in book.BOOK_DIR by default
+        self.use_book = True
+        self.book_dir = None
+        self.book = None
+        self.hooks = []
+        # bound of the entropy lost by the approximate search of the last guess
+        # (see EntropicSolver.sample_size), None if it was not searched
+        self.last_error_bound = None
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["worker_pool"] = None
+        state["hooks"] = []
+        return state
+
+    def add_hook(self, hook):
+        """Call hook (see metrics.SolverHook) on each turn played from now on"""
+        self.hooks.append(hook)
+
+    def remove_hook(self, hook):
+        self.hooks.remove(hook)
+
+    def start_turn(self, space, pool, number, nb_games=1):
+        """Return the metrics of a new turn for the hooks (None without hooks)"""
+        if not self.hooks:
+            return None
+        return Turn(self, space, pool, number, nb_games)
+
+    def get_worker_pool(self, processes):
+        """Return the persistent pool of worker processes of the solver"""
+        if self.worker_pool is not None and self.worker_pool.processes != processes:
+            self.close()
+        if self.worker_pool is None:
+            self.worker_pool = WorkerPool(self, processes)
+        return self.worker_pool
+
+    def close(self):
+        """Stop the worker processes, if any"""
+        if self.worker_pool is not None:
+            self.worker_pool.close()
+            self.worker_pool = None
+
+    def get_code_space(self, nb_colors):
+        return get_code_space(nb_colors, self.nb_pegs)
+
+    def get_book_name(self):
+        """Name of the opening book of the solver, None if it has none.
+        Solvers that can play different guesses need different names."""
+        return None
+
+    def get_book(self):
+        name = self.get_book_name() if self.use_book else None
+        if name is None:
+            return None
+        if self.book is None or self.book.name != name:
+            self.book = OpeningBook(name, self.book_dir)
+        return self.book
+
+    def get_book_guess(self, pool, nb_colors, history=None):
+        """Return (guess, expected information) from the opening book, or None
+        if the book does not cover this point of the game"""
+        space = self.get_code_space(nb_colors)
+        if history is None:
+            if len(pool) != space.size:
+                return None
+            history = []
+        book = self.get_book()
+        if book is None or len(history) >= book.get_plies(self.nb_pegs, nb_colors):
+            return None
+        entry = book.get(
+            self.nb_pegs,
+            nb_colors,
+            [(space.to_string(guess), pattern) for guess, pattern in history],
+        )
+        if entry is None:
+            return None
+        guess, information = entry
+        return space.from_string(guess), information
+
+    def get_cached_guess(self, pool, nb_colors, find_guess):
+        """Return the result of find_guess() for the pool, looking first in the cache
+        where results are keyed by the fingerprint of the pool"""
+        if self.cache is None:
+            return find_guess()
+        key = (nb_colors, get_pool_fingerprint(pool))
+        results = self.cache.get(key)
+        if results is None:
+            results = find_guess()
+            self.cache.put(key, results)
+        return results
 
     @abstractmethod
-    def get_next_guess(self, pool, nb_colors, parallel=True) -> tuple[str, float]:
-        """Return the best guess to make in the pool of possibilities
-        and the expected information in the case of the Entropic Solver"""
+    def get_next_guess(
+        self, pool, nb_colors, parallel=True, history=None
+    ) -> tuple[int, float]:
+        """Return the best guess to make in the pool of possibilities (an array of code indices)
+        and the expected information in the case of the Entropic Solver.
+        history is the list of (guess, pattern) played so far, when the pool is
+        exactly the set of codes consistent with it."""
 
     def solve(
         self,
         nb_colors,
-        custom_pool=[],
+        custom_pool=None,
         alone=True,
         secret=None,
         debug=False,
         parallel=True,
     ):
-        """Solve the game Mastermind with a given number of colors.
+        """Solve the game Mastermind with a given number of colors (and the number of pegs of the solver).
 
         Args:
             nb_colors (int): The number of possible colors in the game.
-            custom_pool (list, optional): A list of all possible codes. Defaults to [].
+            custom_pool (array, optional): An array of the indices of all possible codes. Defaults to the whole code space.
             alone (bool, optional): If True, the function will generate a secret code and play against it. Defaults to True.
-            set_secret (bool, optional): If True, the function will use the secret code given in the secret argument. Defaults to False.
-            secret (str, optional): The secret code to use if set_secret is True. Defaults to None.
+            secret (int, optional): The index of the secret code to use. Defaults to None (random secret).
             debug (bool, optional): If True, the function will print debug information. Defaults to False.
 
 
         Returns:
             tuple: A tuple containing the secret code, the list of guesses and the list of entropy values.
+            Codes are given by their index in the code space (see utils.CodeSpace).
         """
-        current_pool = custom_pool if custom_pool else get_all_codes(nb_colors)
+        space = self.get_code_space(nb_colors)
+        session = GameSession(self, nb_colors, custom_pool)
+        secret_code = None
         if alone:
-            secret_code = secret if secret else random.choice(current_pool)
-        correct = False
+            secret_code = (
+                secret if secret is not None else int(random.choice(session.pool))
+            )
+        if debug:
+            print(space.describe_memory_plan())
         guesses = []
         entropy_values = []
-        while not correct:
-            results = self.get_next_guess(current_pool, nb_colors, parallel=parallel)
+        while not session.won:
+            current_pool = session.pool
+            turn = self.start_turn(space, current_pool, len(guesses) + 1)
+            current_guess, information = session.next_guess(parallel)
+            if turn is not None:
+                turn.mark("scoring")
+            guesses.append(current_guess)
+            entropy_values.append(information)
             if alone:
-                pattern = evaluate_pattern(results[0], secret_code)
+                pattern = space.evaluate(current_guess, secret_code)
+                session.give_feedback(pattern)
             else:
-                pattern = get_clean_feedback()
-            current_guess = results[0]
-            guesses.append(current_guess)
-            entropy_values.append(results[1])
-            new_pool = get_all_codes_matching_pattern(
-                current_guess, pattern, current_pool
-            )
+                pattern = self.read_feedback(session, turn)
+            new_pool = session.pool
+            if turn is not None:
+                turn.mark("filtering")
+                turn.end(current_guess, self.last_error_bound)
             if debug or not alone:
-                print(f"Guess n°{len(guesses)} : {current_guess}")
+                print(f"Guess n°{len(guesses)} : {space.to_string(current_guess)}")
+                well_placed, misplaced = pattern_int_to_list(pattern, self.nb_pegs)
                 print(
-                    f"FeedBack : , {pattern_int_to_list(pattern)[0]} well placed, {pattern_int_to_list(pattern)[1]} misplaced"
+                    f"FeedBack : , {well_placed} well placed, {misplaced} misplaced"
                 )
-                print(f"Expected information : {results[1]} bits")
+                print(f"Expected information : {information} bits")
                 print(
                     f"Actual information received : {log2(len(current_pool) / len(new_pool))} bits, {len(new_pool)} remaining possibilities"
                 )
-            current_pool = new_pool
-
-            if pattern == 20:
-                correct = True
         return secret_code, guesses, entropy_values
 
-    def solve_all_codes(self, nb_colors, parallel=True):
+    def read_feedback(self, session, turn=None):
+        """Ask the feedback of the pending guess of the session until it is consistent
+        with the previous ones, play it and return it.
+        The time waiting for the user is not counted in the turn."""
+        while True:
+            pattern = get_clean_feedback(self.nb_pegs)
+            if turn is not None:
+                turn.mark(None)
+            try:
+                session.give_feedback(pattern)
+                return pattern
+            except ValueError as error:
+                print(error)
+
+    def iter_games(self, nb_colors, secrets=None, parallel=True, pool_sizes=False):
+        """Play the games of all the secrets (default: all codes) together.
+        Secrets sharing the same history form a group whose pool is the set of codes
+        consistent with it : get_next_guess is called once per group, then the group
+        is split by the feedback of the guess. Groups are processed depth first.
+        Yield (secret, guesses, entropy_values) as games end, with the sizes of
+        the pool before each guess as a fourth item if pool_sizes.
+        Each distinct secret is played once : secrets given several times get a
+        single game."""
+        space = self.get_code_space(nb_colors)
+        pool = space.all_codes()
+        secrets = pool if secrets is None else np.unique(secrets)
+        games = self.play_groups(nb_colors, [(pool, secrets, [], [], [])], parallel)
+        return games if pool_sizes else (game[:3] for game in games)
+
+    def play_groups(self, nb_colors, groups, parallel=True):
+        """Play groups of games (see iter_games) until they all end.
+        Yield (secret, guesses, entropy_values, pool_sizes) as games end."""
+        groups = list(groups)
+        while groups:
+            games, sub_groups = self.split_group(nb_colors, groups.pop(), parallel)
+            yield from games
+            groups.extend(reversed(sub_groups))
+
+    def split_group(self, nb_colors, group, parallel=True):
+        """Play the next guess of a group (pool, secrets, history, entropy_values,
+        pool_sizes). Return the games ending with it and the groups of each other
+        feedback."""
+        space = self.get_code_space(nb_colors)
+        pool, secrets, history, entropy_values, pool_sizes = group
+        turn = self.start_turn(space, pool, len(history) + 1, len(secrets))
+        guess, entropy = self.get_next_guess(
+            pool, nb_colors, parallel=parallel, history=history
+        )
+        if turn is not None:
+            turn.mark("scoring")
+        pool_patterns = space.patterns([guess], pool)[0]
+        secret_patterns = (
+            pool_patterns if secrets is pool else space.patterns([guess], secrets)[0]
+        )
+        guesses = [code for code, _ in history] + [guess]
+        entropy_values = entropy_values + [entropy]
+        pool_sizes = pool_sizes + [len(pool)]
+        games, sub_groups = [], []
+        for pattern in np.unique(secret_patterns).tolist():
+            if pattern == space.winning_pattern:
+                games.append((guess, guesses, entropy_values, pool_sizes))
+                continue
+            sub_pool = pool[pool_patterns == pattern]
+            sub_secrets = (
+                sub_pool if secrets is pool else secrets[secret_patterns == pattern]
+            )
+            sub_history = history + [(guess, pattern)]
+            sub_groups.append(
+                (sub_pool, sub_secrets, sub_history, entropy_values, pool_sizes)
+            )
+        if turn is not None:
+            turn.mark("filtering")
+            turn.end(guess, self.last_error_bound)
+        return games, sub_groups
+
+    def solve_all_codes(
+        self,
+        nb_colors,
+        parallel=True,
+        batched=True,
+        processes=None,
+        seed=0,
+        pool_sizes=False,
+    ):
         """Solve the game Mastermind with a given number of colors for all possible secret codes.
-        Return a list of the result of each solve."""
-        pool = get_all_codes(nb_colors)
+        Return a list of the result of each solve, in the order of the codes.
+        With batched, games are played together (see iter_games), otherwise one by one.
+        With processes, groups of games are shared between worker processes
+        (see workers.WorkerPool), seed making random choices reproducible.
+        With pool_sizes (batched games only), results also hold the sizes of the
+        pool before each guess (see iter_games)."""
+        if processes is not None and processes > 1:
+            return self.get_worker_pool(processes).solve_all_codes(
+                nb_colors, parallel, seed, pool_sizes
+            )
+        if batched:
+            games = self.iter_games(nb_colors, parallel=parallel, pool_sizes=pool_sizes)
+            return sorted(games, key=lambda game: game[0])
+        if pool_sizes:
+            raise ValueError("pool_sizes needs batched games")
+        pool = self.get_code_space(nb_colors).all_codes()
         return [
             self.solve(
                 nb_colors,
                 custom_pool=pool,
-                secret=code,
+                secret=int(code),
                 debug=False,
                 parallel=parallel,
             )
@@ -99,32 +318,166 @@ class MastermindSolver(ABC):
         ]
 
 
-class EntropicSolver(MastermindSolver):
-    """A Mastermind solver based on maximising the entropy of the guess"""
+    def get_game_stats(self, nb_colors, parallel=True, processes=None, seed=0):
+        """Play the games of all codes and return their GameStats, without keeping
+        the games in memory (see solve_all_codes for processes and seed)"""
+        if processes is not None and processes > 1:
+            return self.get_worker_pool(processes).get_game_stats(
+                nb_colors, parallel, seed
+            )
+        games = self.iter_games(nb_colors, parallel=parallel, pool_sizes=True)
+        return GameStats(nb_colors, self.nb_pegs).add_games(games)
+
+
+class ScoringSolver(MastermindSolver):
+    """A Mastermind solver choosing the guess with the best score, the scorer being
+    a function of the partition counts of the candidates (see scoring.py).
+    With full_candidates, guesses are chosen among all codes and not only among
+    the codes still possible (which still win ties).
+    With symmetry, only one candidate per class of codes equivalent under the
+    color and position permutations preserving the history is scored.
+    Best guesses are cached by pool, within cache_bytes."""
+
+    def __init__(
+        self,
+        name,
+        alias,
+        scorer,
+        nb_pegs=4,
+        full_candidates=False,
+        symmetry=False,
+        cache_bytes=2**26,
+    ):
+        super().__init__(name, alias, nb_pegs, cache_bytes)
+        self.scorer = scorer
+        self.full_candidates = full_candidates
+        self.symmetry = symmetry
+        self.symmetry_min_work = 2**20
+
+    def get_partition_counts(self, pool, nb_colors):
+        """Return for each code of the pool the number of codes of the pool
+        giving each pattern"""
+        return self.get_code_space(nb_colors).partition_counts(pool, pool)
 
-    def __init__(self):
-        super().__init__("Entropic Solver", "entr")
-        self.first_guesses = self.load_first_guesses()
+    def get_candidates(self, pool, nb_colors, history=None):
+        """Return the guesses to score. With symmetry, the smallest code of each class
+        is kept, so that the best guess is the same as without pruning."""
+        space = self.get_code_space(nb_colors)
+        candidates = space.all_codes() if self.full_candidates else pool
+        if history is None and len(pool) == space.size:
+            history = []
+        # pruning only pays off when scoring is expensive
+        work = len(candidates) * len(pool)
+        if self.symmetry and history is not None and work >= self.symmetry_min_work:
+            group = SymmetryGroup(space, [guess for guess, _ in history])
+            if not group.is_trivial:
+                candidates = group.representatives(candidates)
+        return candidates
 
-    def load_first_guesses(self):
-        with open("src/entropic_first_guesses.json", "r") as f:
-            first_guesses_dict = json.load(f)
-        return first_guesses_dict
+    def get_candidate_scores(self, candidates, pool, nb_colors):
+        """Return the score of each candidate guess against the pool.
+        The (candidates, pool) pattern block is streamed by chunks of candidates."""
+        space = self.get_code_space(nb_colors)
+        return score_candidates(space, candidates, pool, {"score": self.scorer})[
+            "score"
+        ]
 
-    def get_first_guess(self, nb_colors):
-        return self.first_guesses[str(nb_colors)]
+    def choose_best_guess(self, candidates, scores, pool):
+        """Return the candidate with the best score, preferring codes of the pool on ties"""
+        return choose_best_guess(candidates, scores, pool)
 
-    def save_first_guess(self, nb_colors, guess, information_got):
-        with open("src/entropic_first_guesses.json", "r") as f:
-            first_guesses_dict = json.load(f)
-            first_guesses_dict[str(nb_colors)] = (guess, information_got)
-        with open("src/entropic_first_guesses.json", "w") as f:
-            json.dump(first_guesses_dict, f)
+    def get_expected_information(self, guess, score, pool, nb_colors):
+        """Entropy of the guess against the pool, reported with each guess"""
+        counts = self.get_code_space(nb_colors).partition_counts([guess], pool)
+        return float(get_entropies(counts, len(pool))[0])
+
+    def find_best_guess(self, pool, nb_colors, history=None):
+        """Return a tuple of 2 elements :
+        1 : the index of the best guess
+        2 : the entropy of this guess
+        """
+        candidates = self.get_candidates(pool, nb_colors, history)
+        scores = self.get_candidate_scores(candidates, pool, nb_colors)
+        guess, score = self.choose_best_guess(candidates, scores, pool)
+        return guess, self.get_expected_information(guess, score, pool, nb_colors)
+
+    def get_book_name(self):
+        return f"{self.alias}-full" if self.full_candidates else self.alias
+
+    def get_next_guess(self, pool, nb_colors, parallel=True, history=None):
+        results = self.get_book_guess(pool, nb_colors, history)
+        if results is not None:
+            return results
+        return self.get_cached_guess(
+            pool, nb_colors, lambda: self.find_best_guess(pool, nb_colors, history)
+        )
+
+
+class EntropicSolver(ScoringSolver):
+    """A Mastermind solver based on maximising the entropy of the guess.
+    With lookahead_depth > 1, the lookahead_k candidates of best entropy are
+    compared by the information expected from them and the best next guesses,
+    over lookahead_depth guesses. A turn then costs about lookahead_k**(depth - 1)
+    greedy turns, and it is played greedily if the candidates x pool pattern
+    block has more than lookahead_max_work patterns.
+    The lookahead only counts information : a guess which wins is worth no more
+    than one which only identifies the secret. With full_candidates, it then
+    prefers codes outside the pool and plays worse than greedy (4.0048 against
+    3.9616 guesses on average with 5 colors), so this combination warns.
+    With a sample_size, turns on pools of more codes first estimate the entropy
+    of the candidates on a random sample of the pool : the ones which are worse
+    than another with sample_confidence are discarded, the others are scored
+    exactly. A smaller sample is faster but keeps more candidates.
+    The error bound of each guess searched is kept in last_error_bound (0 for
+    an exact search) and given to the turn metrics. Samples are drawn with the
+    random module, or from sample_seed and the pool if it is set, so that the
+    same pool always gets the same sample."""
+
+    def __init__(
+        self,
+        nb_pegs=4,
+        full_candidates=False,
+        symmetry=False,
+        cache_bytes=2**26,
+        lookahead_depth=1,
+        lookahead_k=8,
+        lookahead_max_work=2**24,
+        sample_size=None,
+        sample_confidence=0.999,
+        sample_seed=None,
+    ):
+        super().__init__(
+            "Entropic Solver",
+            "entr",
+            entropy_score,
+            nb_pegs,
+            full_candidates,
+            symmetry,
+            cache_bytes,
+        )
+        self.lookahead_depth = lookahead_depth
+        if full_candidates and lookahead_depth > 1:
+            warnings.warn(
+                "The lookahead ignores the chance of winning : with full_candidates "
+                "it plays worse than greedy",
+                stacklevel=2,
+            )
+        self.lookahead_k = lookahead_k
+        self.lookahead_max_work = lookahead_max_work
+        self.sample_size = sample_size
+        self.sample_confidence = sample_confidence
+        self.sample_seed = sample_seed
+
+    def get_book_name(self):
+        name = super().get_book_name()
+        if self.lookahead_depth > 1:
+            name += f"-la{self.lookahead_depth}k{self.lookahead_k}"
+        return name
 
     def get_patterns_probability_distribution(self, code, pool):
         """Return for each pattern the number of codes that get it as feedback
-        when testing against all possibilities in the pool"""
-        distribution = np.zeros(41, dtype=np.uint16)
+        when testing against all possibilities in the pool (codes given as color digits)"""
+        distribution = np.zeros(get_nb_patterns(len(code)), dtype=np.uint32)
         for x in pool:
             distribution[evaluate_pattern(code, x)] += 1
         return distribution / len(pool)
@@ -146,70 +499,193 @@ class EntropicSolver(MastermindSolver):
 
     def find_best_guess_old(self, pool, nb_colors):
         """Return a tuple of 2 elements :
-        1 : the string of the best guess
+        1 : the index of the best guess
         2 : the entropy of this guess
         """
-        ### if first guess, get it from the json file
-        if len(pool) == nb_colors**4:
-            if str(nb_colors) in self.first_guesses:
-                results = self.get_first_guess(nb_colors)
-                return results
-
+        space = self.get_code_space(nb_colors)
+        codes = space.digits[pool].tolist()
         max_entropy = -np.inf
-        best_guess = ""
-        for guess in pool:
-            guess_entropy = self.expected_information(guess, pool)
+        best_guess = None
+        for guess, code in zip(pool, codes):
+            guess_entropy = self.expected_information(code, codes)
             if guess_entropy >= max_entropy:
-                best_guess = guess
+                best_guess = int(guess)
                 max_entropy = guess_entropy
+        return best_guess, max_entropy
 
-        results = (best_guess, max_entropy)
-        ### if new first guess, save it in the json file
-        if len(pool) == nb_colors**4:
-            self.save_first_guess(nb_colors, *results)
-        return results
+    def get_patterns_probability_distribution_matrix(self, pool, nb_colors):
+        return self.get_partition_counts(pool, nb_colors) / len(pool)
 
-    def get_patterns_probability_distribution_matrix(self, pool):
-        pattern_matrix = evaluate_pattern_matrix(pool)
-        n = len(pool)
-        distributions = np.zeros((n, 21), dtype=np.float32)
-        n_range = np.arange(n)
-        prob = 1 / n
-        for j in range(n):
-            distributions[n_range, pattern_matrix[:, j]] += prob
-        return distributions
+    def get_candidate_entropies(self, candidates, pool, nb_colors):
+        return self.get_candidate_scores(candidates, pool, nb_colors)
 
     def get_entropy(self, distributions):
-        axis = len(distributions.shape) - 1
-        return stats.entropy(distributions, base=2, axis=axis)
+        """Entropy in bits of each probability distribution (along the last axis)"""
+        distributions = np.asarray(distributions, dtype=np.float64)
+        logs = np.log2(
+            distributions, out=np.zeros_like(distributions), where=distributions > 0
+        )
+        return -(distributions * logs).sum(axis=-1)
+
+    def get_expected_information(self, guess, score, pool, nb_colors):
+        return score
+
+    def get_lookahead_values(self, space, pool, candidates, patterns, depth):
+        """Return the information expected over depth guesses for each candidate
+        (-inf for the ones not explored), patterns being the candidates x pool block.
+        Sub-pools reuse sub-blocks of patterns."""
+        n = len(pool)
+        counts = get_partition_counts(patterns, space.nb_patterns)
+        entropies = get_entropies(counts, n)
+        if depth == 1 or n <= 2:
+            return entropies, entropies
+        k = min(self.lookahead_k, len(candidates))
+        values = np.full(len(candidates), -np.inf)
+        for i in np.argpartition(-entropies, k - 1)[:k]:
+            values[i] = entropies[i]
+            row = patterns[i]
+            for pattern in np.unique(row).tolist():
+                in_sub_pool = row == pattern
+                m = np.count_nonzero(in_sub_pool)
+                if pattern == space.winning_pattern or m <= 1:
+                    continue
+                sub_pool = pool[in_sub_pool]
+                if self.full_candidates:
+                    sub_candidates = candidates
+                    sub_patterns = patterns[:, in_sub_pool]
+                else:
+                    sub_candidates = sub_pool
+                    sub_patterns = patterns[np.ix_(in_sub_pool, in_sub_pool)]
+                sub_values, _ = self.get_lookahead_values(
+                    space, sub_pool, sub_candidates, sub_patterns, depth - 1
+                )
+                values[i] += m / n * sub_values.max()
+        return values, entropies
 
-    def find_best_guess(self, pool, nb_colors):
+    def find_best_lookahead_guess(self, pool, nb_colors):
+        """Return the best guess looking lookahead_depth guesses ahead,
+        and its entropy"""
+        space = self.get_code_space(nb_colors)
+        candidates = space.all_codes() if self.full_candidates else pool
+        patterns = space.patterns(candidates, pool)
+        values, entropies = self.get_lookahead_values(
+            space, pool, candidates, patterns, self.lookahead_depth
+        )
+        # many candidates resolve the whole pool within depth guesses :
+        # keep the most informative right now among them
+        ties = values >= values.max() - 1e-9
+        return self.choose_best_guess(candidates[ties], entropies[ties], pool)
+
+    def find_best_sampled_guess(self, pool, nb_colors, history=None):
+        """Return the best guess among the candidates not discarded on a sample of
+        sample_size codes of the pool, its entropy, and an error bound : the
+        entropy of a discarded candidate is at most this much higher (each with
+        sample_confidence). The bound is 0 when no candidate is discarded."""
+        space = self.get_code_space(nb_colors)
+        candidates = self.get_candidates(pool, nb_colors, history)
+        n = min(self.sample_size, len(pool))
+        if self.sample_seed is None:
+            seed = random.getrandbits(64)
+        else:
+            fingerprint = get_pool_fingerprint(pool)[1]
+            seed = [self.sample_seed, int.from_bytes(fingerprint, "little")]
+        rng = np.random.default_rng(seed)
+        sample = np.sort(rng.choice(pool, n, replace=False))
+        z = NormalDist().inv_cdf(self.sample_confidence)
+        counts = space.partition_counts(candidates, sample)
+        lower, upper = get_entropy_bounds(counts, n, len(pool), z)
+        kept = upper >= lower.max()
+        scores = self.get_candidate_scores(candidates[kept], pool, nb_colors)
+        guess, entropy = self.choose_best_guess(candidates[kept], scores, pool)
+        error_bound = max(0.0, float(upper[~kept].max(initial=0.0)) - entropy)
+        return guess, entropy, error_bound
+
+    def find_best_guess(self, pool, nb_colors, history=None):
         """Return a tuple of 2 elements :
-        1 : the string of the best guess
+        1 : the index of the best guess
         2 : the entropy of this guess
         """
-        if len(pool) == nb_colors**4:
-            if str(nb_colors) in self.first_guesses:
-                results = self.get_first_guess(nb_colors)
-                return results
-        distributions = self.get_patterns_probability_distribution_matrix(pool)
-        entropies = self.get_entropy(distributions)
-        results = pool[np.argmax(entropies)], float(np.max(entropies))
-        if len(pool) == nb_colors**4:
-            self.save_first_guess(nb_colors, *results)
-        return results
+        space = self.get_code_space(nb_colors)
+        work = len(pool) * (space.size if self.full_candidates else len(pool))
+        lookahead = self.lookahead_depth > 1 and work <= self.lookahead_max_work
+        self.last_error_bound = 0.0
+        if lookahead and len(pool) > 2:
+            return self.find_best_lookahead_guess(pool, nb_colors)
+        if self.sample_size is not None and len(pool) > self.sample_size:
+            guess, entropy, error_bound = self.find_best_sampled_guess(
+                pool, nb_colors, history
+            )
+            self.last_error_bound = error_bound
+            return guess, entropy
+        return super().find_best_guess(pool, nb_colors, history)
 
-    def get_next_guess(self, pool, nb_colors, parallel=True):
+    def get_next_guess(self, pool, nb_colors, parallel=True, history=None):
+        self.last_error_bound = None
         if parallel:
-            return self.find_best_guess(pool, nb_colors)
+            return super().get_next_guess(pool, nb_colors, parallel, history)
+        results = self.get_book_guess(pool, nb_colors, history)
+        if results is not None:
+            return results
+        self.last_error_bound = 0.0
         return self.find_best_guess_old(pool, nb_colors)
 
 
+class MinimaxSolver(ScoringSolver):
+    """A Mastermind solver minimizing the worst case number of codes left (Knuth)"""
+
+    def __init__(
+        self, nb_pegs=4, full_candidates=False, symmetry=False, cache_bytes=2**26
+    ):
+        super().__init__(
+            "Minimax Solver",
+            "mini",
+            minimax_score,
+            nb_pegs,
+            full_candidates,
+            symmetry,
+            cache_bytes,
+        )
+
+
+class ExpectedSizeSolver(ScoringSolver):
+    """A Mastermind solver minimizing the expected number of codes left"""
+
+    def __init__(
+        self, nb_pegs=4, full_candidates=False, symmetry=False, cache_bytes=2**26
+    ):
+        super().__init__(
+            "Expected Size Solver",
+            "size",
+            expected_size_score,
+            nb_pegs,
+            full_candidates,
+            symmetry,
+            cache_bytes,
+        )
+
+
+class MostPartsSolver(ScoringSolver):
+    """A Mastermind solver maximizing the number of possible feedbacks"""
+
+    def __init__(
+        self, nb_pegs=4, full_candidates=False, symmetry=False, cache_bytes=2**26
+    ):
+        super().__init__(
+            "Most Parts Solver",
+            "part",
+            most_parts_score,
+            nb_pegs,
+            full_candidates,
+            symmetry,
+            cache_bytes,
+        )
+
+
 class RandomSolver(MastermindSolver):
     """A Mastermind solver based on random guesses"""
 
-    def __init__(self):
-        super().__init__("Random Solver", "rand")
+    def __init__(self, nb_pegs=4):
+        super().__init__("Random Solver", "rand", nb_pegs)
 
-    def get_next_guess(self, pool, nb_colors, parallel=True):
-        return random.choice(pool), 0.0
+    def get_next_guess(self, pool, nb_colors, parallel=True, history=None):
+        return int(random.choice(pool)), 0.0
@@ -0,0 +1,146 @@
+import numpy as np
+
+from solvers import MastermindSolver
+from utils import partition_pool
+
+
+class StrategyTree:
+    """The complete strategy of a solver for one configuration, compiled once.
+    Node 0 is the first guess, children[node, pattern] is the node played after
+    getting pattern as feedback (-1 if that feedback is impossible or winning).
+    solved[node] tells if the guess of the node can be the secret, depths[node]
+    is the number of guesses played before it."""
+
+    def __init__(
+        self, nb_colors, nb_pegs, guesses, entropies, children, solved, depths
+    ):
+        self.nb_colors = nb_colors
+        self.nb_pegs = nb_pegs
+        self.guesses = guesses
+        self.entropies = entropies
+        self.children = children
+        self.solved = solved
+        self.depths = depths
+
+    @classmethod
+    def build(cls, solver, nb_colors):
+        """Run the solver once on every reachable history of the game"""
+        space = solver.get_code_space(nb_colors)
+        guesses, entropies, children, solved, depths = [], [], [], [], []
+
+        def add_node(pool, history):
+            guess, entropy = solver.get_next_guess(pool, nb_colors, history=history)
+            node = len(guesses)
+            guesses.append(guess)
+            entropies.append(entropy)
+            children.append(np.full(space.nb_patterns, -1, dtype=np.int32))
+            solved.append(False)
+            depths.append(len(history))
+            for pattern, sub_pool in partition_pool(guess, pool, space).items():
+                if pattern == space.winning_pattern:
+                    solved[node] = True
+                elif len(sub_pool) == len(pool):
+                    raise ValueError(
+                        f"{solver.name} made no progress with {space.to_string(guess)}"
+                    )
+                else:
+                    children[node][pattern] = add_node(
+                        sub_pool, history + [(guess, pattern)]
+                    )
+            return node
+
+        add_node(space.all_codes(), [])
+        return cls(
+            nb_colors,
+            space.nb_pegs,
+            np.array(guesses, dtype=np.int64),
+            np.array(entropies),
+            np.array(children),
+            np.array(solved),
+            np.array(depths, dtype=np.int32),
+        )
+
+    def save(self, path):
+        np.savez_compressed(
+            path,
+            config=np.array([self.nb_colors, self.nb_pegs]),
+            guesses=self.guesses,
+            entropies=self.entropies,
+            children=self.children,
+            solved=self.solved,
+            depths=self.depths,
+        )
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            nb_colors, nb_pegs = data["config"].tolist()
+            return cls(
+                nb_colors,
+                nb_pegs,
+                data["guesses"],
+                data["entropies"],
+                data["children"],
+                data["solved"],
+                data["depths"],
+            )
+
+    def get_node(self, history):
+        """Follow the feedback edges of the (guess, pattern) history from the root"""
+        node = 0
+        for _, pattern in history:
+            node = self.children[node, pattern]
+            if node < 0:
+                raise ValueError(f"Feedback {pattern} is not possible here")
+        return int(node)
+
+    def get_next_guess(self, history):
+        node = self.get_node(history)
+        return int(self.guesses[node]), float(self.entropies[node])
+
+    def solve_all_codes(self):
+        """Return the result of the game of each secret code, in the order of the codes,
+        like MastermindSolver.solve_all_codes. Each solved node ends one game."""
+        parents = np.full(len(self.guesses), -1)
+        rows, _ = np.nonzero(self.children >= 0)
+        parents[self.children[self.children >= 0]] = rows
+        results = []
+        leaves = np.flatnonzero(self.solved)
+        for node in leaves[np.argsort(self.guesses[leaves])]:
+            path = []
+            while node >= 0:
+                path.append(node)
+                node = parents[node]
+            path.reverse()
+            guesses = self.guesses[path].tolist()
+            results.append((guesses[-1], guesses, self.entropies[path].tolist()))
+        return results
+
+    def get_nb_guesses_histogram(self):
+        """Number of secrets found with each number of guesses"""
+        return np.bincount(self.depths[self.solved] + 1)
+
+    @property
+    def average_nb_guesses(self):
+        histogram = self.get_nb_guesses_histogram()
+        return float(histogram @ np.arange(len(histogram)) / histogram.sum())
+
+    @property
+    def max_nb_guesses(self):
+        return len(self.get_nb_guesses_histogram()) - 1
+
+
+class TreeSolver(MastermindSolver):
+    """A Mastermind solver replaying compiled strategy trees"""
+
+    def __init__(self, *trees):
+        super().__init__("Tree Solver", "tree", trees[0].nb_pegs)
+        self.trees = {tree.nb_colors: tree for tree in trees}
+
+    def get_next_guess(self, pool, nb_colors, parallel=True, history=None):
+        if history is None:
+            raise ValueError("TreeSolver needs the history of the game")
+        return self.trees[nb_colors].get_next_guess(history)
+
+    def solve_all_codes(self, nb_colors, parallel=True, batched=True, **kwargs):
+        return self.trees[nb_colors].solve_all_codes()
@@ -0,0 +1,83 @@
+import itertools as it
+
+import numpy as np
+
+
+class SymmetryGroup:
+    """Permutations of the positions and of the colors that leave every guess of a
+    history unchanged.
+    Such a permutation keeps all feedbacks, so it maps the pool of the codes still
+    possible onto itself, and two candidate guesses exchanged by it get the same
+    partition of the pool : only one of them needs to be scored.
+
+    An element is a position permutation with the color map it forces on the colors
+    used in the history. Colors never used (free colors) can be exchanged at will."""
+
+    def __init__(self, space, guesses=()):
+        self.space = space
+        guesses = space.digits[list(guesses)].reshape(-1, space.nb_pegs)
+        used = np.zeros(space.nb_colors, dtype=bool)
+        used[guesses.ravel()] = True
+        self.free_colors = np.flatnonzero(~used)
+        self.elements = []
+        for permutation in it.permutations(range(space.nb_pegs)):
+            color_map = self.get_color_map(guesses, permutation, used)
+            if color_map is not None:
+                self.elements.append((np.array(permutation), color_map))
+
+    def get_color_map(self, guesses, permutation, used):
+        """Return the color map sending guesses[:, permutation] back to guesses,
+        or None if there is no such bijection of the used colors"""
+        color_map = np.arange(self.space.nb_colors)
+        images = np.full(self.space.nb_colors, -1)
+        for source, target in zip(guesses[:, permutation].ravel(), guesses.ravel()):
+            if images[source] not in (-1, target):
+                return None
+            images[source] = target
+        if len(set(images[used])) != used.sum():
+            return None
+        color_map[used] = images[used]
+        return color_map
+
+    @property
+    def is_trivial(self):
+        return len(self.elements) == 1 and len(self.free_colors) < 2
+
+    def relabel_free_colors(self, digits):
+        """Rename the free colors of each code in order of appearance from the last peg,
+        which gives the smallest index among the codes differing by free colors"""
+        n = len(digits)
+        rows = np.arange(n)
+        is_free = np.isin(digits, self.free_colors)
+        mapping = np.full((n, self.space.nb_colors), -1, dtype=np.int16)
+        nb_assigned = np.zeros(n, dtype=np.int64)
+        relabelled = digits.copy()
+        for j in reversed(range(self.space.nb_pegs)):
+            colors = digits[:, j]
+            new = is_free[:, j] & (mapping[rows, colors] < 0)
+            mapping[rows[new], colors[new]] = self.free_colors[nb_assigned[new]]
+            nb_assigned[new] += 1
+            free_rows = rows[is_free[:, j]]
+            relabelled[free_rows, j] = mapping[free_rows, colors[free_rows]]
+        return relabelled
+
+    def canonical(self, codes):
+        """Return for each code the smallest index of its equivalence class"""
+        digits = self.space.digits[codes]
+        canonical = np.full(len(codes), self.space.size)
+        for permutation, color_map in self.elements:
+            image = color_map[digits[:, permutation]]
+            if len(self.free_colors) > 1:
+                image = self.relabel_free_colors(image)
+            canonical = np.minimum(canonical, self.space.digits_to_index(image))
+        return canonical
+
+    def representatives(self, codes):
+        """Return one code (the smallest) per equivalence class of codes, sorted.
+        codes must be a union of classes (e.g. the pool, or all codes)"""
+        return np.unique(self.canonical(codes))
+
+    def orbit(self, code):
+        """Return all the codes equivalent to code, to map a representative back"""
+        codes = self.space.all_codes()
+        return codes[self.canonical(codes) == self.canonical([code])[0]]
@@ -1,20 +1,83 @@
+import os
+import random
+import asyncio
+import sys
+import json
+import subprocess
+import tempfile
+import threading
 import unittest
-from solvers import EntropicSolver, MastermindSolver, RandomSolver
+import numpy as np
+import mastermind
+from benchmark import compare_results, run_benchmarks
+from book import BOOK_VERSION, OpeningBook
+from build_books import build_book
+from scoring import SCORERS, compare_scorers
+from solvers import (
+    EntropicSolver,
+    ExpectedSizeSolver,
+    MastermindSolver,
+    MinimaxSolver,
+    MostPartsSolver,
+    RandomSolver,
+)
+from game_stats import GameStats, update_results
+from metrics import MetricsCollector
+from monte_carlo import evaluate_solver
+from optimal import OptimalSolver
+from strategy import StrategyTree, TreeSolver
+from server import GameServer
+from session import GameSession
+from symmetry import SymmetryGroup
+import utils
+from utils import (
+    get_all_codes,
+    load_pattern_matrix,
+    plan_pattern_matrix,
+    set_memory_budget,
+    get_code_space,
+    get_entropies,
+    get_entropy_bounds,
+    evaluate_patterns,
+    evaluate_pattern_matrix,
+    evaluate_pattern_matrix_grid,
+    evaluate_pattern,
+    filter_pool_mask,
+)
 
 
 class TestEntropicSolver(unittest.TestCase):
     def setUp(self) -> None:
-        self.test_solvers: list[MastermindSolver] = [EntropicSolver(), RandomSolver()]
+        self.test_solvers: list[MastermindSolver] = [
+            EntropicSolver(),
+            MinimaxSolver(),
+            ExpectedSizeSolver(),
+            MostPartsSolver(),
+            RandomSolver(),
+        ]
         return super().setUp()
 
     def test_find_best_guess(self):
-        pool = ["AAAA", "AAAB", "AABB", "ABBB", "BBBB"]
+        space = get_code_space(4)
+        pool = np.array(
+            [space.from_string(code) for code in ["AAAA", "AAAB", "AABB", "ABBB", "BBBB"]]
+        )
         for solver in self.test_solvers:
             guess, entropy = solver.get_next_guess(pool, 4)
             self.assertIn(guess, pool)
             self.assertIsInstance(entropy, float)
             self.assertGreaterEqual(entropy, 0)
 
+    def test_entropy_kernel(self):
+        solver = EntropicSolver()
+        pool = get_code_space(3).all_codes()[::3]
+        distributions = solver.get_patterns_probability_distribution_matrix(pool, 3)
+        self.assertTrue(np.allclose(distributions.sum(axis=1), 1))
+        np.testing.assert_allclose(
+            get_entropies(solver.get_partition_counts(pool, 3), len(pool)),
+            solver.get_entropy(distributions),
+        )
+
     def test_solve(self):
         for solver in self.test_solvers:
             results = solver.solve_all_codes(2)
@@ -23,6 +86,606 @@ class TestEntropicSolver(unittest.TestCase):
                 self.assertIsInstance(res, tuple)
                 self.assertEqual(len(res), 3)
                 self.assertGreater(8, len(res[1]))
+                self.assertEqual(res[1][-1], res[0])
+
+    def test_solve_full_candidates(self):
+        results = EntropicSolver(full_candidates=True).solve_all_codes(3)
+        pool_results = EntropicSolver().solve_all_codes(3)
+        for secret, guesses, _ in results:
+            self.assertEqual(guesses[-1], secret)
+        self.assertLessEqual(
+            sum(len(res[1]) for res in results),
+            sum(len(res[1]) for res in pool_results),
+        )
+
+    def test_solve_symmetry(self):
+        for full_candidates in [False, True]:
+            solver = EntropicSolver(full_candidates=full_candidates, symmetry=True)
+            solver.symmetry_min_work = 0
+            reference = EntropicSolver(full_candidates=full_candidates)
+            self.assertEqual(solver.solve_all_codes(4), reference.solve_all_codes(4))
+
+    def test_solve_batched(self):
+        solver = EntropicSolver(full_candidates=True, cache_bytes=0)
+        self.assertEqual(
+            solver.solve_all_codes(4), solver.solve_all_codes(4, batched=False)
+        )
+        secrets = [3, 50, 51]
+        games = sorted(solver.iter_games(4, secrets))
+        self.assertEqual(games, [solver.solve(4, secret=secret) for secret in secrets])
+        # all the codes in another order, or secrets given twice
+        permutation = np.random.default_rng(0).permutation(256)
+        games = sorted(solver.iter_games(4, permutation))
+        self.assertEqual(games, solver.solve_all_codes(4))
+        games = sorted(solver.iter_games(4, secrets + secrets[::-1]))
+        self.assertEqual(games, [solver.solve(4, secret=secret) for secret in secrets])
+
+    def test_solve_processes(self):
+        solver = EntropicSolver()
+        try:
+            results = solver.solve_all_codes(4, processes=2)
+            self.assertEqual(results, EntropicSolver().solve_all_codes(4))
+        finally:
+            solver.close()
+        solver = RandomSolver()
+        try:
+            random.seed(2)
+            random_state = random.getstate()
+            results = solver.solve_all_codes(3, processes=2, seed=1)
+            self.assertEqual(random.getstate(), random_state)
+            self.assertEqual(len(results), 81)
+            self.assertEqual(solver.solve_all_codes(3, processes=2, seed=1), results)
+        finally:
+            solver.close()
+
+    def test_guess_cache(self):
+        solver = EntropicSolver()
+        solver.use_book = False
+        results = solver.solve_all_codes(3, batched=False)
+        stats = solver.cache.get_stats()
+        self.assertGreater(stats["hits"], stats["misses"])
+        self.assertEqual(EntropicSolver(cache_bytes=0).solve_all_codes(3), results)
+        small_solver = EntropicSolver(cache_bytes=2000)
+        self.assertEqual(small_solver.solve_all_codes(3), results)
+        self.assertLessEqual(small_solver.cache.nbytes, 2000)
+
+    def test_game_session(self):
+        solver = EntropicSolver()
+        space = get_code_space(6)
+        secret = space.from_string("FEAB")
+        _, expected_guesses, expected_entropies = solver.solve(6, secret=secret)
+        session = GameSession(solver, 6)
+        game = session.play()
+        guess, information = next(game)
+        guesses, entropies = [guess], [information]
+        state = None
+        while True:
+            if len(guesses) == 2 and state is None:
+                # suspend the game, and resume it from its serialized state
+                state = json.loads(json.dumps(session.to_state()))
+                session = GameSession.from_state(solver, state)
+                game = session.play()
+                guess, information = next(game)
+                self.assertEqual(guess, guesses[-1])
+            try:
+                guess, information = game.send(space.evaluate(guess, secret))
+            except StopIteration:
+                break
+            guesses.append(guess)
+            entropies.append(information)
+        self.assertEqual(guesses, expected_guesses)
+        self.assertEqual(entropies, expected_entropies)
+        self.assertTrue(session.won)
+        self.assertEqual(session.pool.tolist(), [secret])
+        with self.assertRaises(ValueError):
+            session.next_guess()
+        session = GameSession(solver, 6)
+        session.next_guess()
+        with self.assertRaises(ValueError):
+            # 3 well placed and 4 misplaced
+            session.give_feedback((space.nb_pegs + 1) * 3 + 4)
+        self.assertEqual(session.history, [])
+        # the mask is refined in place, and left as it was by a rejected feedback
+        session.give_feedback(0)
+        pool = session.pool
+        session.next_guess()
+        with self.assertRaises(ValueError):
+            session.give_feedback((space.nb_pegs + 1) * 3 + 1)
+        self.assertEqual(session.pool.tolist(), pool.tolist())
+
+    def test_game_stats(self):
+        results = EntropicSolver().solve_all_codes(5)
+        game_stats = GameStats(5, nb_worst=3).add_games(results)
+        nb_guesses = [len(res[1]) for res in results]
+        self.assertAlmostEqual(game_stats.average_nb_guesses, np.mean(nb_guesses))
+        self.assertEqual(game_stats.max_nb_guesses, max(nb_guesses))
+        self.assertEqual(game_stats.histogram, np.bincount(nb_guesses).tolist())
+        opener = get_code_space(5).to_string(results[0][1][0])
+        self.assertEqual(game_stats.best_opener, opener)
+        worst = [
+            (res[0], len(res[1])) for res in results if len(res[1]) == max(nb_guesses)
+        ]
+        self.assertEqual(game_stats.get_worst_secrets(), worst[:3])
+        turns = game_stats.get_turn_information()
+        self.assertEqual(turns[0]["nb_games"], 625)
+        # the pool sizes of the games give the same summary without filtering
+        sized_results = EntropicSolver().solve_all_codes(5, pool_sizes=True)
+        sized_stats = GameStats(5, nb_worst=3).add_games(sized_results)
+        self.assertEqual(sized_stats.to_dict(), game_stats.to_dict())
+        # the games can be summarized as they end, also in worker processes
+        solver = EntropicSolver()
+        expected = GameStats(5).add_games(results).to_dict()
+        expected_turns = expected.pop("turns")
+        for processes in (None, 2):
+            streamed = solver.get_game_stats(5, processes=processes).to_dict()
+            for turn, expected_turn in zip(streamed.pop("turns"), expected_turns):
+                self.assertAlmostEqual(turn["actual"], expected_turn["actual"])
+            self.assertEqual(streamed, expected)
+        solver.close()
+        # every secret is equally likely : the feedbacks bring what was expected
+        for turn in turns:
+            self.assertAlmostEqual(turn["expected"], turn["actual"])
+        merged = GameStats(5, nb_worst=3).add_games(results[::2])
+        merged.merge(GameStats(5, nb_worst=3).add_games(results[1::2]))
+        merged_turns = merged.get_turn_information()
+        for merged_turn, turn in zip(merged_turns, turns):
+            self.assertAlmostEqual(merged_turn["actual"], turn["actual"])
+        self.assertEqual(merged.histogram, game_stats.histogram)
+        self.assertEqual(merged.get_worst_secrets(), game_stats.get_worst_secrets())
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "resultats.json")
+            small_results = EntropicSolver().solve_all_codes(2)
+            update_results(path, [GameStats(2).add_games(small_results)])
+            results = update_results(path, [game_stats], "_minimax")
+        self.assertEqual(results["average_nb_guess"], [0, 2.75])
+        self.assertEqual(results["information_to_get_minimax"], [0, 0, 0, 0, 9.2877])
+        self.assertEqual(results["best_openers_minimax"][:4], [""] * 4)
+
+    def test_monte_carlo(self):
+        solver = EntropicSolver()
+        results = solver.solve_all_codes(5)
+        average = np.mean([len(res[1]) for res in results])
+        options = dict(target=0.05, batch_size=64, min_games=256, seed=1)
+        serial = evaluate_solver(solver, 5, **options)
+        low, high = serial["confidence_interval"]
+        self.assertLessEqual((high - low) / 2, 0.05)
+        self.assertTrue(low <= average <= high)
+        # the batches are the same whatever the number of processes
+        parallel = evaluate_solver(solver, 5, processes=2, **options)
+        solver.close()
+        self.assertEqual(parallel["nb_games"], serial["nb_games"])
+        self.assertEqual(parallel["stats"].histogram, serial["stats"].histogram)
+        random.seed(3)
+        random_state = random.getstate()
+        capped = evaluate_solver(EntropicSolver(), 5, target=0, max_games=300)
+        self.assertEqual(capped["nb_games"], 300)
+        self.assertEqual(random.getstate(), random_state)
+
+    def test_metrics(self):
+        solver = EntropicSolver()
+        collector = MetricsCollector(trace_memory=True)
+        solver.add_hook(collector)
+        _, guesses, _ = solver.solve(4, secret=42)
+        self.assertEqual([turn["guess"] for turn in collector.turns], guesses)
+        self.assertEqual(collector.turns[0]["pool_size"], 256)
+        self.assertGreater(collector.turns[0]["allocated_bytes"], 0)
+        collector.close()
+        collector.trace_memory = False
+        collector.clear()
+        results = solver.solve_all_codes(4)
+        nb_games = [0] * 8
+        for turn in collector.turns:
+            nb_games[turn["turn"]] += turn["nb_games"]
+        for number in range(1, 8):
+            still_playing = sum(len(res[1]) >= number for res in results)
+            self.assertEqual(nb_games[number], still_playing)
+        nb_turns = len(collector.turns)
+        self.assertEqual(len(collector.to_json_lines().splitlines()), nb_turns)
+        self.assertIn(
+            'mastermind_games_total{solver="entr",pegs="4",colors="4",turn="1"} 256',
+            collector.to_prometheus(),
+        )
+        solver.remove_hook(collector)
+        solver.solve(4, secret=42)
+        self.assertEqual(len(collector.turns), nb_turns)
+        # the pattern matrix is loaded (and timed) only when a turn needs it
+        solver.add_hook(collector)
+        space = utils.CodeSpace(4)
+        turn = solver.start_turn(space, space.all_codes(), 1)
+        self.assertFalse(space.is_pattern_matrix_loaded)
+        space.pattern_matrix
+        turn.mark("scoring")
+        self.assertEqual(turn.seconds["matrix"], space.load_seconds)
+        self.assertGreater(space.load_seconds, 0)
+
+    def test_opening_book(self):
+        solver = EntropicSolver(full_candidates=True)
+        solver.use_book = False
+        results = solver.solve_all_codes(4)
+        with tempfile.TemporaryDirectory() as directory:
+            build_book(("entr-full", 4, 4, 2, directory))
+            book_solver = EntropicSolver(full_candidates=True, cache_bytes=0)
+            book_solver.book_dir = directory
+            self.assertEqual(book_solver.get_book().get_plies(4, 4), 2)
+            self.assertEqual(book_solver.solve_all_codes(4), results)
+            book = OpeningBook("entr-full", directory)
+            self.assertEqual(book.get(4, 4, []), book_solver.get_book().get(4, 4, []))
+            self.assertIsNone(book.get(4, 4, [("AAAA", 0)]))
+            with open(book.path, "w") as f:
+                json.dump({"version": BOOK_VERSION + 1, "configs": {}}, f)
+            book.reload()
+            self.assertEqual(book.get_plies(4, 4), 0)
+
+    def test_cli_book_lookup(self):
+        script = (
+            "import sys, mastermind; mastermind.main(['solve', '--colors', '6']); "
+            "print('numpy' in sys.modules)"
+        )
+        output = subprocess.run(
+            [sys.executable, "-c", script],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.split("\n")
+        self.assertTrue(output[0].startswith("DCBA"))
+        self.assertEqual(output[1], "False")
+        for argv in (
+            ["solve", "--colors", "6", "ZZZZ:00"],
+            ["solve", "DCBA:40"],
+            ["solve", "ABCD:32"],
+            ["play", "--colors", "4", "--secret", "ZZZZ"],
+            ["solve", "--colors", "-2"],
+            ["solve", "--colors", "27"],
+            ["solve", "--pegs", "0"],
+            ["bench", "--solver", "rand", "--full"],
+        ):
+            with self.assertRaises(SystemExit):
+                mastermind.main(argv)
+
+    def test_strategy_tree(self):
+        solver = EntropicSolver(full_candidates=True)
+        results = solver.solve_all_codes(3)
+        tree = StrategyTree.build(solver, 3)
+        self.assertEqual(tree.solve_all_codes(), results)
+        self.assertAlmostEqual(
+            tree.average_nb_guesses, np.mean([len(res[1]) for res in results])
+        )
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "tree.npz")
+            tree.save(path)
+            tree_solver = TreeSolver(StrategyTree.load(path))
+        self.assertEqual(tree_solver.solve(3, secret=42), results[42])
+        self.assertEqual(tree_solver.solve_all_codes(3), results)
+
+    def test_optimal_solver(self):
+        solver = OptimalSolver(full_candidates=True)
+        self.assertEqual(solver.get_expected_nb_guesses(4), 905 / 256)
+        tree = solver.build_strategy_tree(4)
+        self.assertEqual(tree.average_nb_guesses, 905 / 256)
+        results = TreeSolver(tree).solve_all_codes(4)
+        self.assertEqual(results, solver.solve_all_codes(4))
+        entropic_results = EntropicSolver(full_candidates=True).solve_all_codes(4)
+        self.assertLessEqual(
+            sum(len(res[1]) for res in results),
+            sum(len(res[1]) for res in entropic_results),
+        )
+
+    def test_scorers(self):
+        space = get_code_space(6)
+        pool = space.all_codes()[::7]
+        best_guesses = compare_scorers(space, pool)
+        self.assertEqual(set(best_guesses), set(SCORERS))
+        solvers = {
+            "entropy": EntropicSolver(),
+            "minimax": MinimaxSolver(),
+            "expected_size": ExpectedSizeSolver(),
+            "most_parts": MostPartsSolver(),
+        }
+        for name, solver in solvers.items():
+            guess, _ = solver.get_next_guess(pool, 6)
+            self.assertEqual(guess, best_guesses[name][0])
+        # Knuth's strategy never needs more than 5 guesses
+        results = MinimaxSolver(full_candidates=True).solve_all_codes(6)
+        self.assertEqual(max(len(res[1]) for res in results), 5)
+
+    def test_sampled_entropy(self):
+        space = get_code_space(6)
+        pool = space.all_codes()
+        counts = space.partition_counts(pool, pool)
+        # a sample of the whole pool gives the exact entropies
+        lower, upper = get_entropy_bounds(counts, len(pool), len(pool), 3.0)
+        np.testing.assert_allclose(lower, get_entropies(counts, len(pool)))
+        np.testing.assert_allclose(upper, lower)
+        sample = np.sort(np.random.default_rng(0).choice(pool, 162, replace=False))
+        sample_counts = space.partition_counts(pool, sample)
+        lower, upper = get_entropy_bounds(sample_counts, len(sample), len(pool), 3.0)
+        exact = get_entropies(counts, len(pool))
+        self.assertTrue(np.all(lower <= upper))
+        self.assertGreater(np.mean((lower <= exact) & (exact <= upper)), 0.99)
+        exact_solver = EntropicSolver(cache_bytes=0)
+        solver = EntropicSolver(cache_bytes=0, sample_size=128)
+        for solver_ in (exact_solver, solver):
+            solver_.use_book = False
+        guess, entropy, error_bound = solver.find_best_sampled_guess(pool, 6)
+        self.assertEqual((guess, entropy), exact_solver.find_best_guess(pool, 6))
+        self.assertGreaterEqual(error_bound, 0)
+        collector = MetricsCollector()
+        solver.add_hook(collector)
+        nb_guesses = [len(res[1]) for res in solver.solve_all_codes(6)]
+        exact_nb_guesses = [len(res[1]) for res in exact_solver.solve_all_codes(6)]
+        self.assertAlmostEqual(np.mean(nb_guesses), np.mean(exact_nb_guesses))
+        # the error bound of each approximate search reaches the metrics
+        for turn in collector.turns:
+            if turn["pool_size"] > 128:
+                self.assertGreaterEqual(turn["error_bound"], 0)
+        self.assertIn("mastermind_error_bound_bits_total", collector.to_prometheus())
+        # with a seed, the sample only depends on the pool
+        pool = pool[::3]
+        seeded = [
+            EntropicSolver(cache_bytes=0, sample_size=64, sample_seed=5)
+            for _ in range(2)
+        ]
+        random_state = random.getstate()
+        results = [s.find_best_sampled_guess(pool, 6) for s in seeded]
+        self.assertEqual(results[0], results[1])
+        self.assertEqual(random.getstate(), random_state)
+
+    def test_lookahead(self):
+        greedy = EntropicSolver().solve_all_codes(6)
+        solver = EntropicSolver(lookahead_depth=2, lookahead_k=8)
+        results = solver.solve_all_codes(6)
+        for secret, guesses, _ in results:
+            self.assertEqual(guesses[-1], secret)
+        self.assertLessEqual(
+            sum(len(res[1]) for res in results), sum(len(res[1]) for res in greedy)
+        )
+        with self.assertWarns(UserWarning):
+            EntropicSolver(full_candidates=True, lookahead_depth=2)
+
+    def test_solve_pegs(self):
+        results = RandomSolver(nb_pegs=5).solve_all_codes(2)
+        self.assertEqual(len(results), 32)
+        for secret, guesses, _ in results:
+            self.assertEqual(guesses[-1], secret)
+
+
+class TestGameServer(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.solver = EntropicSolver()
+        self.server = GameServer(self.solver, max_sessions=50, idle_timeout=60)
+        server = await self.server.start(port=0)
+        port = server.sockets[0].getsockname()[1]
+        self.reader, self.writer = await asyncio.open_connection("127.0.0.1", port)
+
+    async def asyncTearDown(self):
+        self.writer.close()
+        await self.server.stop()
+
+    async def request(self, **request):
+        self.writer.write(json.dumps(request).encode() + b"\n")
+        return json.loads(await self.reader.readline())
+
+    async def test_games(self):
+        space = get_code_space(6)
+        secrets = [0, 100, 1295]
+        responses = [await self.request(op="new", colors=6) for _ in secrets]
+        guesses = [[response["guess"]] for response in responses]
+        playing = set(range(len(secrets)))
+        while playing:
+            for i in sorted(playing):
+                pattern = space.evaluate(space.from_string(guesses[i][-1]), secrets[i])
+                response = await self.request(
+                    op="feedback",
+                    session=responses[i]["session"],
+                    feedback=divmod(pattern, space.nb_pegs + 1),
+                )
+                if response.get("won"):
+                    playing.remove(i)
+                else:
+                    guesses[i].append(response["guess"])
+        for secret, game_guesses in zip(secrets, guesses):
+            _, expected, _ = self.solver.solve(6, secret=secret)
+            self.assertEqual(game_guesses, space.to_strings(expected))
+        stats = await self.request(op="stats")
+        self.assertEqual(stats["sessions"], 3)
+        self.assertEqual(stats["latencies"]["new"]["count"], 3)
+        self.assertIn("p99", stats["latencies"]["feedback"])
+
+    async def test_sessions(self):
+        response = await self.request(op="new", colors=4)
+        state = await self.request(op="state", session=response["session"])
+        resumed = await self.request(op="resume", state=state["state"])
+        self.assertEqual(resumed["guess"], response["guess"])
+        self.assertIn("error", await self.request(op="feedback", session="x"))
+        self.assertIn("error", await self.request(op="play"))
+        self.server.idle_timeout = 0
+        await asyncio.sleep(0.01)
+        self.server.evict_idle_sessions()
+        self.assertEqual(self.server.sessions, {})
+        self.assertIn(
+            "error",
+            await self.request(
+                op="feedback", session=response["session"], feedback=[0, 0]
+            ),
+        )
+
+    async def test_rejected_requests(self):
+        response = await self.request(op="new", colors=6)
+        for colors in (0, 27, 11):
+            self.assertIn("error", await self.request(op="new", colors=colors))
+        state = await self.request(op="state", session=response["session"])
+        state["state"]["nb_colors"] = 27
+        self.assertIn("error", await self.request(op="resume", state=state["state"]))
+        # an overloaded server leaves the game as it was : the feedback can be resent
+        self.server.max_waiting = 0
+        feedback = dict(op="feedback", session=response["session"], feedback=[0, 0])
+        self.assertIn("overloaded", (await self.request(**feedback))["error"])
+        self.assertIn("overloaded", (await self.request(op="new", colors=4))["error"])
+        self.server.max_waiting = 1
+        self.assertIn("guess", await self.request(**feedback))
+        self.assertEqual(len(self.server.sessions), 1)
+        # states of big code spaces are longer than the default line limit
+        self.assertIn("sessions", await self.request(op="stats", padding="x" * 10**5))
+        empty_state = dict(state["state"], pool_mask="AAAA")
+        self.assertIn("error", await self.request(op="resume", state=empty_state))
+
+    async def test_feedback_off_loop(self):
+        # filtering may load the pattern matrix : it runs in the thread pool
+        response = await self.request(op="new", colors=6)
+        game = self.server.sessions[response["session"]].game
+        threads = []
+        give_feedback = game.give_feedback
+
+        def record_thread(pattern):
+            threads.append(threading.current_thread())
+            return give_feedback(pattern)
+
+        game.give_feedback = record_thread
+        await self.request(op="feedback", session=response["session"], feedback=[0, 1])
+        self.assertEqual(len(threads), 1)
+        self.assertIsNot(threads[0], threading.main_thread())
+
+
+class TestBenchmark(unittest.TestCase):
+    def test_run_benchmarks(self):
+        results = run_benchmarks([3], repeats=2)
+        self.assertEqual(len(results), 7)
+        for result in results.values():
+            self.assertTrue(result["check"])
+            self.assertLessEqual(result["min"], result["median"])
+        baseline = {key: dict(result) for key, result in results.items()}
+        self.assertEqual(compare_results(results, baseline), {})
+        baseline["solve_all_codes[3]"]["median"] /= 2
+        regressions = compare_results(results, baseline)
+        self.assertEqual(list(regressions), ["solve_all_codes[3]"])
+
+
+class TestCodeSpace(unittest.TestCase):
+    def test_indices_match_strings(self):
+        space = get_code_space(3)
+        codes = get_all_codes(3)
+        self.assertEqual(space.to_strings(space.all_codes()), codes)
+        for index, code in enumerate(codes):
+            self.assertEqual(space.from_string(code), index)
+
+    def test_memory_plans(self):
+        self.assertEqual(plan_pattern_matrix(4096), "dense")
+        self.assertEqual(plan_pattern_matrix(4096, 2**20), "mmap")
+        self.assertEqual(plan_pattern_matrix(4096, 2**20, 2**20), "matrix-free")
+        expected = np.asarray(get_code_space(5).pattern_matrix)
+        with tempfile.TemporaryDirectory() as directory:
+            matrix = load_pattern_matrix(get_code_space(5), directory)
+            self.assertIsInstance(matrix, np.memmap)
+            np.testing.assert_array_equal(matrix, expected)
+            del matrix
+            # a failed build leaves no partial file
+            broken_space = utils.CodeSpace(3)
+            broken_space.digits = broken_space.digits + 10
+            with self.assertRaises(IndexError):
+                load_pattern_matrix(broken_space, directory)
+            self.assertEqual(os.listdir(directory), ["pattern_matrix_4_5.npy"])
+        budgets = utils.MEMORY_BUDGET, utils.DISK_BUDGET
+        results = []
+        try:
+            for mode, memory_budget, disk_budget in [
+                ("dense", 2**20, 2**20),
+                ("mmap", 0, 2**20),
+                ("matrix-free", 0, 0),
+            ]:
+                set_memory_budget(memory_budget, disk_budget)
+                space = get_code_space(5)
+                self.assertEqual(space.matrix_mode, mode)
+                solver = EntropicSolver(cache_bytes=0)
+                pool = space.all_codes()
+                guess, _ = solver.find_best_guess(pool, 5)
+                mask = np.ones(space.size, dtype=bool)
+                sub_pool = np.flatnonzero(filter_pool_mask(mask, guess, 2, space))
+                sub_guess = solver.find_best_guess(sub_pool, 5)
+                results.append((guess, sub_pool.tolist(), sub_guess))
+        finally:
+            set_memory_budget(*budgets)
+        self.assertEqual(results[0], results[1])
+        self.assertEqual(results[0], results[2])
+
+    def test_pattern_matrix_methods(self):
+        codes = get_code_space(3).digits
+        expected = evaluate_patterns(codes.tolist())
+        np.testing.assert_array_equal(evaluate_pattern_matrix_grid(codes), expected)
+        np.testing.assert_array_equal(evaluate_pattern_matrix(codes), expected)
+        np.testing.assert_array_equal(
+            evaluate_pattern_matrix(codes, max_bytes=1000), expected
+        )
+
+    def test_pattern_matrix_pegs(self):
+        for nb_colors, nb_pegs in [(5, 3), (3, 5), (2, 6)]:
+            space = get_code_space(nb_colors, nb_pegs)
+            codes = space.all_codes()
+            self.assertEqual(
+                space.to_strings(codes), get_all_codes(nb_colors, nb_pegs)
+            )
+            expected = evaluate_patterns(space.digits.tolist())
+            np.testing.assert_array_equal(
+                evaluate_pattern_matrix(space.digits), expected
+            )
+            np.testing.assert_array_equal(space.patterns(codes, codes), expected)
+
+    def test_symmetry_group(self):
+        space = get_code_space(6)
+        representatives = SymmetryGroup(space).representatives(space.all_codes())
+        self.assertEqual(
+            space.to_strings(representatives), ["AAAA", "BAAA", "BBAA", "CBAA", "DCBA"]
+        )
+        # after BCDD, A, E and F are interchangeable, as well as the last two pegs
+        group = SymmetryGroup(space, [space.from_string("BCDD")])
+        orbit = space.to_strings(group.orbit(space.from_string("AAAE")))
+        self.assertEqual(len(orbit), 12)
+        self.assertIn("FFEF", orbit)
+        self.assertIn("EEEA", orbit)
+
+    def test_filter_pool_mask(self):
+        space = get_code_space(4, 5)
+        codes = space.digits.tolist()
+        mask = np.ones(space.size, dtype=bool)
+        expected = set(range(space.size))
+        for guess, secret in [(5, 700), (123, 700), (700, 700)]:
+            pattern = space.evaluate(guess, secret)
+            self.assertEqual(pattern, evaluate_pattern(codes[guess], codes[secret]))
+            filter_pool_mask(mask, guess, pattern, space)
+            expected = {
+                code
+                for code in expected
+                if evaluate_pattern(codes[guess], codes[code]) == pattern
+            }
+            self.assertEqual(set(np.flatnonzero(mask)), expected)
+        self.assertEqual(list(np.flatnonzero(mask)), [700])
+
+    def test_pattern_sub_matrix(self):
+        space = get_code_space(3)
+        pool = np.array([0, 5, 17, 42, 80])
+        np.testing.assert_array_equal(
+            space.patterns(pool, pool), evaluate_pattern_matrix(space.digits[pool])
+        )
+        # all the codes, in another order
+        permutation = np.random.default_rng(0).permutation(space.size)
+        np.testing.assert_array_equal(
+            space.patterns(permutation, permutation),
+            evaluate_pattern_matrix(space.digits[permutation]),
+        )
+        np.testing.assert_array_equal(
+            space.patterns(pool, permutation),
+            evaluate_pattern_matrix(space.digits[pool], space.digits[permutation]),
+        )
+        free_space = utils.CodeSpace(3, memory_budget=0, disk_budget=0)
+        self.assertEqual(free_space.matrix_mode, "matrix-free")
+        for rows in ([17], pool):
+            np.testing.assert_array_equal(
+                free_space.patterns(rows, pool), space.patterns(rows, pool)
+            )
+        np.testing.assert_array_equal(
+            free_space.partition_counts(pool, pool, max_bytes=100),
+            space.partition_counts(pool, pool),
+        )
 
 
 if __name__ == "__main__":
@@ -1,78 +1,348 @@
 import os
+import sys
 import math
+import hashlib
+import threading
+import time
 import numpy as np
+import string
 import itertools as it
+from collections import OrderedDict
+from functools import cached_property, lru_cache
 
 DATA_DIR = os.path.join(os.path.dirname(__file__), "data")
+CACHE_DIR = os.environ.get("MASTERMIND_CACHE_DIR", os.path.join(DATA_DIR, "cache"))
+PATTERN_BLOCK_BYTES = 64 * 2**20
+# the full pattern matrix is kept in RAM within MEMORY_BUDGET, memory-mapped
+# from a file within DISK_BUDGET, and not stored above (see plan_pattern_matrix)
+MEMORY_BUDGET = int(os.environ.get("MASTERMIND_MEMORY_BUDGET", 2**28))
+DISK_BUDGET = int(os.environ.get("MASTERMIND_DISK_BUDGET", 2**33))
+NB_PATTERNS = 21
+COLORS = string.ascii_uppercase
 
 
 def log2(x):
     return math.log2(x) if x > 0 else 0
 
 
-def get_all_codes(nb_colors):
-    colors = ["A", "B", "C", "D", "E", "F", "G", "H"]
-
+def get_all_codes(nb_colors, nb_pegs=4):
+    """Return the strings of all codes, the first peg changing the fastest"""
     codes = [
-        f"{w}{z}{y}{x}"
-        for x in colors[:nb_colors]
-        for y in colors[:nb_colors]
-        for z in colors[:nb_colors]
-        for w in colors[:nb_colors]
+        "".join(reversed(code))
+        for code in it.product(COLORS[:nb_colors], repeat=nb_pegs)
     ]
     return codes
 
 
+def get_nb_patterns(nb_pegs=4):
+    """Patterns are encoded as (nb_pegs + 1) * well placed + misplaced"""
+    return (nb_pegs + 1) ** 2
+
+
+def get_winning_pattern(nb_pegs=4):
+    return nb_pegs * (nb_pegs + 1)
+
+
+class CodeSpace:
+    """All the codes of a game, each one identified by its integer index.
+    The index of a code is its value in base nb_colors, the first peg being the
+    least significant digit, so that index i is the code get_all_codes(nb_colors, nb_pegs)[i].
+    Strings are only used to read or print codes."""
+
+    def __init__(self, nb_colors, nb_pegs=4, memory_budget=None, disk_budget=None):
+        self.nb_colors = nb_colors
+        self.nb_pegs = nb_pegs
+        self.size = nb_colors**nb_pegs
+        self.nb_patterns = get_nb_patterns(nb_pegs)
+        self.winning_pattern = get_winning_pattern(nb_pegs)
+        self.powers = nb_colors ** np.arange(nb_pegs)
+        self.digits = self.index_to_digits(self.all_codes())
+        self.matrix_mode = plan_pattern_matrix(self.size, memory_budget, disk_budget)
+        self._pattern_matrix = None
+        # seconds spent loading the pattern matrix (see metrics.Turn)
+        self.load_seconds = 0.0
+
+    def all_codes(self):
+        """Return the pool of all codes, as an array of indices"""
+        return np.arange(self.size)
+
+    def index_to_digits(self, indices):
+        """Return the (n, nb_pegs) array of color digits of the codes"""
+        indices = np.asarray(indices)
+        return ((indices[..., None] // self.powers) % self.nb_colors).astype(np.uint8)
+
+    def digits_to_index(self, digits):
+        return np.asarray(digits, dtype=np.int64) @ self.powers
+
+    def from_string(self, code):
+        return int(self.digits_to_index([ord(c) - 65 for c in code]))
+
+    def to_string(self, index):
+        return "".join(COLORS[d] for d in self.digits[index])
+
+    def to_strings(self, indices):
+        return [self.to_string(index) for index in indices]
+
+    @property
+    def has_pattern_matrix(self):
+        """Whether the full pattern matrix is stored (in RAM or memory-mapped)"""
+        return self.matrix_mode != "matrix-free"
+
+    def describe_memory_plan(self):
+        nbytes = f"{self.size**2 / 2**20:.1f} MiB"
+        return {
+            "dense": f"Pattern matrix in RAM ({nbytes})",
+            "mmap": f"Pattern matrix memory-mapped from {self.get_matrix_path()} "
+            f"({nbytes})",
+            "matrix-free": f"No pattern matrix ({nbytes}), rows computed on demand",
+        }[self.matrix_mode]
+
+    def get_matrix_path(self, cache_dir=None):
+        return os.path.join(
+            cache_dir or CACHE_DIR,
+            f"pattern_matrix_{self.nb_pegs}_{self.nb_colors}.npy",
+        )
+
+    @property
+    def is_pattern_matrix_loaded(self):
+        return self._pattern_matrix is not None
+
+    @property
+    def pattern_matrix(self):
+        """The full (size, size) pattern matrix, loaded on first use"""
+        if self._pattern_matrix is None:
+            start = time.perf_counter()
+            self._pattern_matrix = load_pattern_matrix(
+                self, in_memory=self.matrix_mode == "dense"
+            )
+            self.load_seconds += time.perf_counter() - start
+        return self._pattern_matrix
+
+    def set_pattern_matrix(self, pattern_matrix):
+        """Use an already loaded full pattern matrix (e.g. in shared memory)"""
+        self._pattern_matrix = pattern_matrix
+
+    def evaluate_row(self, code, cols):
+        """Patterns between one code and the codes cols, from the digit and color
+        count tables"""
+        well_placed = np.count_nonzero(self.digits[cols] == self.digits[code], axis=1)
+        common = np.minimum(self.color_counts[cols], self.color_counts[code])
+        return (self.nb_pegs * well_placed + common.sum(axis=1)).astype(np.uint8)
+
+    def patterns(self, rows, cols, right=None):
+        """Return the sub-matrix of the patterns between the codes rows and cols.
+        Without a stored pattern matrix, the patterns are computed from the digits
+        and the color counts of the codes (right being the operand of cols, see
+        get_right_operand, if it is already computed)."""
+        if not self.has_pattern_matrix:
+            if len(rows) == 1:
+                return self.evaluate_row(rows[0], cols)[None]
+            return evaluate_pattern_matrix(
+                self.digits[rows], self.digits[cols], self.nb_colors, right=right
+            )
+        if self.is_all_codes(cols):
+            if self.is_all_codes(rows):
+                return np.asarray(self.pattern_matrix)
+            return self.pattern_matrix[rows]
+        return self.pattern_matrix[np.ix_(rows, cols)]
+
+    def is_all_codes(self, codes):
+        """Whether codes are all the codes, in the order of their indices"""
+        return len(codes) == self.size and np.array_equal(codes, self.all_codes())
+
+    def iter_partition_counts(self, rows, cols, max_bytes=PATTERN_BLOCK_BYTES):
+        """Yield (start, counts) by blocks of rows, counts being for each code of the
+        block the number of codes of cols giving each pattern.
+        Pattern blocks are streamed so that memory stays linear in len(cols)."""
+        block_size = max(1, max_bytes // (9 * max(1, len(cols))))
+        right = None
+        if not self.has_pattern_matrix and len(rows) > 1:
+            right = get_right_operand(self.digits[cols], self.nb_colors)
+        for start in range(0, len(rows), block_size):
+            block_rows = rows[start : start + block_size]
+            yield start, get_partition_counts(
+                self.patterns(block_rows, cols, right), self.nb_patterns, max_bytes
+            )
+
+    def partition_counts(self, rows, cols, max_bytes=PATTERN_BLOCK_BYTES):
+        """Return for each code of rows the number of codes of cols giving each pattern"""
+        counts = np.empty((len(rows), self.nb_patterns), dtype=np.int64)
+        for start, block_counts in self.iter_partition_counts(rows, cols, max_bytes):
+            counts[start : start + len(block_counts)] = block_counts
+        return counts
+
+    @cached_property
+    def color_counts(self):
+        """(size, nb_colors) table of the number of pegs of each color of each code"""
+        counts = np.zeros((self.size, self.nb_colors), dtype=np.uint8)
+        for j in range(self.nb_pegs):
+            counts[np.arange(self.size), self.digits[:, j]] += 1
+        return counts
+
+    def evaluate(self, code1, code2):
+        """Evaluate the pattern between two codes given by their indices,
+        from the digit and color count tables"""
+        well_placed = np.count_nonzero(self.digits[code1] == self.digits[code2])
+        common = np.minimum(self.color_counts[code1], self.color_counts[code2]).sum()
+        return int(self.nb_pegs * well_placed + common)
+
+
+@lru_cache(maxsize=None)
+def get_code_space(nb_colors, nb_pegs=4):
+    """Return the (shared) code space of a game configuration"""
+    return CodeSpace(nb_colors, nb_pegs)
+
+
+def plan_pattern_matrix(size, memory_budget=None, disk_budget=None):
+    """Choose how to store the (size, size) pattern matrix of one byte per pattern:
+    "dense" in RAM if it fits in memory_budget, else "mmap" (memory-mapped file)
+    if it fits in disk_budget, else "matrix-free" (rows computed when needed).
+    Budgets default to MEMORY_BUDGET and DISK_BUDGET."""
+    memory_budget = MEMORY_BUDGET if memory_budget is None else memory_budget
+    disk_budget = DISK_BUDGET if disk_budget is None else disk_budget
+    if size**2 <= memory_budget:
+        return "dense"
+    if size**2 <= disk_budget:
+        return "mmap"
+    return "matrix-free"
+
+
+def set_memory_budget(memory_budget=None, disk_budget=None):
+    """Change the budgets of the code spaces created from now on
+    (the shared code spaces of get_code_space are created again)"""
+    global MEMORY_BUDGET, DISK_BUDGET
+    if memory_budget is not None:
+        MEMORY_BUDGET = memory_budget
+    if disk_budget is not None:
+        DISK_BUDGET = disk_budget
+    get_code_space.cache_clear()
+
+
+def load_pattern_matrix(space, cache_dir=None, in_memory=False):
+    """Return the full pattern matrix of a code space, memory-mapped from a .npy file
+    (or read in memory). The first time, the file is written by blocks of rows
+    through a memory map, so that the matrix never needs to fit in memory."""
+    path = space.get_matrix_path(cache_dir)
+    if not os.path.exists(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            pattern_matrix = np.lib.format.open_memmap(
+                tmp_path, mode="w+", dtype=np.uint8, shape=(space.size, space.size)
+            )
+            evaluate_pattern_matrix(
+                space.digits, nb_colors=space.nb_colors, out=pattern_matrix
+            )
+            pattern_matrix.flush()
+            del pattern_matrix
+            os.replace(tmp_path, path)
+        except BaseException:
+            # do not leave a partial file, which may be big, in the cache
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+    return np.load(path, mmap_mode=None if in_memory else "r")
+
+
 def evaluate_pattern(code1, code2):
     """Evaluate the correction pattern got from the comparison of code1 and code2
+    Codes can be strings or sequences of color digits.
     This function is symmetric, i.e. evaluate_pattern(code1, code2) == evaluate_pattern(code2, code1)
-    Returns an integer between 0 and 80 (3**4 possible patterns)"""
-    pattern = [0, 0, 0, 0]
+    Returns an integer, (nb_pegs + 1) * well placed + misplaced (between 0 and 20 for 4 pegs)"""
+    pattern = [0] * len(code1)
+    code2 = list(code2)
     for i in range(len(code1)):
         if code1[i] == code2[i] and pattern[i] == 0:
             pattern[i] = 2
-            code2 = code2[0:i] + " " + code2[i + 1 : 4]
+            code2[i] = None
     for i in range(len(code1)):
         if code1[i] in code2 and pattern[i] == 0:
             pattern[i] = 1
-            for j in range(len(code2)):
-                if code2[j] == code1[i]:
-                    code2 = code2[0:j] + " " + code2[j + 1 : 4]
-                    break
+            code2[code2.index(code1[i])] = None
 
-    return 5 * (pattern.count(2)) + (pattern.count(1))
+    return (len(code1) + 1) * (pattern.count(2)) + (pattern.count(1))
 
 
 def evaluate_patterns(pool):
-    """Evaluate naively all patterns between all codes in the pool"""
+    """Evaluate naively all patterns between all codes in the pool (strings or digits)"""
     pattern_matrix = np.zeros((len(pool), len(pool)), dtype=np.uint8)
     for i, code1 in enumerate(pool):
-        for j, code2 in enumerate(pool[i:]):
+        for j, code2 in enumerate(pool[i:], start=i):
             pattern_matrix[i, j] = evaluate_pattern(code1, code2)
             pattern_matrix[j, i] = pattern_matrix[i, j]
     return pattern_matrix
 
 
-def pattern_int_to_list(pattern):
-    return [pattern // 5, pattern % 5]
+def pattern_int_to_list(pattern, nb_pegs=4):
+    return [pattern // (nb_pegs + 1), pattern % (nb_pegs + 1)]
 
 
-def code_to_int_array(code):
-    return np.array([ord(c) - 65 for c in code], dtype=np.uint8)
+def get_pattern_encodings(codes, nb_colors):
+    """Encode codes (given as color digits) as two indicator matrices:
+    - positions (n, nb_pegs * nb_colors): peg i has color c
+    - counts (n, nb_colors * nb_pegs): color c appears more than t times
+    The dot product of two position rows is the number of well placed colors,
+    the one of two count rows is sum(min(count1[c], count2[c])), the number of
+    common colors."""
+    n, nb_pegs = codes.shape
+    positions = np.zeros((n, nb_pegs, nb_colors), dtype=np.float32)
+    positions[np.arange(n)[:, None], np.arange(nb_pegs), codes] = 1
+    counts = positions.sum(axis=1)[:, :, None] > np.arange(nb_pegs)
+    return positions.reshape(n, -1), counts.reshape(n, -1).astype(np.float32)
 
 
-def evaluate_pattern_matrix(pool):
-    """Evaluate all patterns between all codes in the pool using vectorized operations"""
-    pattern_matrix = np.zeros((len(pool), len(pool)), dtype=np.uint8)
-    nl = 4
-    pool = np.array([code_to_int_array(code) for code in pool])
-    ncode = len(pool)
-    equality_grid = np.zeros((ncode, ncode, nl, nl), dtype=bool)
+def get_right_operand(codes, nb_colors):
+    """Columns [positions, counts] of the codes in evaluate_pattern_matrix"""
+    positions, counts = get_pattern_encodings(codes, nb_colors)
+    return np.hstack((positions, counts)).T
+
+
+def evaluate_pattern_matrix(
+    codes1,
+    codes2=None,
+    nb_colors=None,
+    out=None,
+    max_bytes=PATTERN_BLOCK_BYTES,
+    right=None,
+):
+    """Evaluate all patterns between two arrays of codes (given as color digits,
+    see CodeSpace.digits) with matrix products.
+    With p pegs, b well placed and t common colors, the pattern (p + 1) * b + (t - b)
+    = p * b + t is the product of [p * positions, counts] by [positions, counts].T
+    Rows are computed by blocks so that temporary arrays stay under max_bytes.
+    right can be given when the same codes2 are used many times.
+    Return a (len(codes1), len(codes2)) matrix (or fill out), codes2 defaults to codes1"""
+    if codes2 is None:
+        codes2 = codes1
+    if nb_colors is None:
+        nb_colors = int(max(codes1.max(initial=0), codes2.max(initial=0))) + 1
+    if out is None:
+        out = np.empty((len(codes1), len(codes2)), dtype=np.uint8)
+    positions1, counts1 = get_pattern_encodings(codes1, nb_colors)
+    left = np.hstack((codes1.shape[1] * positions1, counts1))
+    if right is None:
+        right = get_right_operand(codes2, nb_colors)
+    block_size = max(1, max_bytes // (4 * max(1, len(codes2))))
+    for start in range(0, len(codes1), block_size):
+        stop = start + block_size
+        out[start:stop] = left[start:stop] @ right
+    return out
+
+
+def evaluate_pattern_matrix_grid(codes1, codes2=None):
+    """Evaluate all patterns between two arrays of codes (given as color digits,
+    see CodeSpace.digits) using a (n1, n2, nb_pegs, nb_pegs) equality grid.
+    Kept as a reference for evaluate_pattern_matrix."""
+    if codes2 is None:
+        codes2 = codes1
+    pattern_matrix = np.zeros((len(codes1), len(codes2)), dtype=np.uint8)
+    nl = codes1.shape[1]
+    equality_grid = np.zeros((len(codes1), len(codes2), nl, nl), dtype=bool)
     for i, j in it.product(range(nl), range(nl)):
-        equality_grid[:, :, i, j] = np.equal.outer(pool[:, i], pool[:, j])
+        equality_grid[:, :, i, j] = np.equal.outer(codes1[:, i], codes2[:, j])
     for i in range(nl):
         matches = equality_grid[:, :, i, i].flatten()
-        pattern_matrix.flat[matches] += 5
+        pattern_matrix.flat[matches] += nl + 1
         for k in range(nl):
             equality_grid[:, :, k, i].flat[matches] = False
             equality_grid[:, :, i, k].flat[matches] = False
@@ -86,20 +356,159 @@ def evaluate_pattern_matrix(pool):
     return pattern_matrix
 
 
-def get_clean_feedback():
+def get_partition_counts(
+    pattern_matrix, nb_patterns=NB_PATTERNS, max_bytes=PATTERN_BLOCK_BYTES
+):
+    """Return the (n_rows, nb_patterns) matrix of integer counts, for each row of the
+    pattern matrix, of the codes giving each pattern.
+    A single bincount of row * nb_patterns + pattern per block of rows."""
+    n_rows, n_cols = pattern_matrix.shape
+    counts = np.empty((n_rows, nb_patterns), dtype=np.int64)
+    block_size = max(1, max_bytes // (8 * max(1, n_cols)))
+    for start in range(0, n_rows, block_size):
+        block = pattern_matrix[start : start + block_size]
+        offsets = np.arange(len(block))[:, None] * nb_patterns + block
+        counts[start : start + len(block)] = np.bincount(
+            offsets.ravel(), minlength=len(block) * nb_patterns
+        ).reshape(-1, nb_patterns)
+    return counts
+
+
+XLOG2X_TABLE = np.zeros(2)
+
+
+def get_xlog2x_table(size):
+    """Return a table of c * log2(c) for all integers c up to size (at least)"""
+    global XLOG2X_TABLE
+    if len(XLOG2X_TABLE) <= size:
+        c = np.arange(max(size + 1, 2 * len(XLOG2X_TABLE)))
+        XLOG2X_TABLE = c * np.log2(np.maximum(c, 1))
+    return XLOG2X_TABLE
+
+
+def get_entropies(counts, n):
+    """Entropy (in bits) of each row of partition counts of n codes:
+    log2(n) - sum(c * log2(c)) / n"""
+    table = get_xlog2x_table(n)
+    return log2(n) - table[counts].sum(axis=-1) / n
+
+
+def get_entropy_bounds(counts, n, population, z):
+    """Bounds (lower, upper) of the entropies of the partitions of a population of
+    codes, from the partition counts of a random sample of n of them.
+    The entropy of the sample is biased low by about (K - 1) / (2 n ln 2) for K
+    patterns seen (Miller-Madow), and deviates by about z standard deviations,
+    sqrt(Var(log2 p) / n) by the delta method, shrunk for a sample without
+    replacement. Both vanish when the sample is the whole population."""
+    entropies = get_entropies(counts, n)
+    correction = (population - n) / max(1, population - 1)
+    logs = np.log2(np.maximum(counts, 1)) - log2(n)
+    variances = np.maximum((counts * logs**2).sum(axis=-1) / n - entropies**2, 0)
+    half_widths = z * np.sqrt(variances * correction / n)
+    biases = (np.count_nonzero(counts, axis=-1) - 1) / (2 * n * math.log(2))
+    return entropies - half_widths, entropies + 2 * correction * biases + half_widths
+
+
+def get_clean_feedback(nb_pegs=4):
     """If you play against someone, you enter yourself feedback.
-    This function reads and cleans user input : return an integer between 0 and 40"""
+    This function reads and cleans user input : return the pattern integer"""
     while True:
-        feedback = input("Entrez le feedback : ")
-        if feedback.isdigit():
-            if feedback in list(str(x) + str(y) for x in range(5) for y in range(5)):
-                return 5 * int(feedback[0]) + int(feedback[1])
+        feedback = input("Entrez le feedback : ").strip()
+        values = feedback.split() if " " in feedback else list(feedback)
+        if len(values) == 2 and all(value.isdigit() for value in values):
+            well_placed, misplaced = map(int, values)
+            if well_placed + misplaced <= nb_pegs:
+                return (nb_pegs + 1) * well_placed + misplaced
         print(
-            "Please respect format : 2 digits between 0 and 4 without spaces. "
+            f"Please respect format : 2 numbers (sum at most {nb_pegs}), "
+            "separated by a space if needed. "
             "First is nb of well placed colors, second is nb of misplaced"
         )
 
 
-def get_all_codes_matching_pattern(code, feedback_pattern, pool):
-    """Finds all codes that are still possible as an answer, based on the feedback pattern"""
-    return list(filter(lambda x: evaluate_pattern(code, x) == feedback_pattern, pool))
+def partition_pool(code, pool, space):
+    """Split the pool by the pattern each code gives against code.
+    Return a dict pattern -> sub-pool (sorted like the pool)"""
+    patterns = space.patterns([code], pool)[0]
+    order = np.argsort(patterns, kind="stable")
+    values, starts = np.unique(patterns[order], return_index=True)
+    return {
+        int(pattern): pool[indices]
+        for pattern, indices in zip(values, np.split(order, starts[1:]))
+    }
+
+
+def get_pool_fingerprint(pool):
+    """Cheap key of a pool : its size and a hash of its (sorted) index array"""
+    pool = np.ascontiguousarray(pool, dtype=np.int64)
+    return len(pool), hashlib.blake2b(pool.tobytes(), digest_size=16).digest()
+
+
+class GuessCache:
+    """Least recently used cache of results, holding at most about max_bytes.
+    It can be shared between threads."""
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state["lock"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, key):
+        return key in self.entries
+
+    def get_entry_bytes(self, key, value):
+        return sys.getsizeof(key) + sys.getsizeof(value) + 100
+
+    def get(self, key):
+        with self.lock:
+            value = self.entries.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.entries.move_to_end(key)
+            return value
+
+    def put(self, key, value):
+        with self.lock:
+            if key in self.entries:
+                self.nbytes -= self.get_entry_bytes(key, self.entries.pop(key))
+            self.entries[key] = value
+            self.nbytes += self.get_entry_bytes(key, value)
+            while self.nbytes > self.max_bytes and self.entries:
+                old_key, old_value = self.entries.popitem(last=False)
+                self.nbytes -= self.get_entry_bytes(old_key, old_value)
+
+    def get_stats(self):
+        with self.lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "entries": len(self.entries),
+                "bytes": self.nbytes,
+            }
+
+
+def filter_pool_mask(mask, code, feedback_pattern, space, pool=None):
+    """Refine in place the boolean mask (over all codes) of the codes still possible,
+    with the row of patterns of code against the codes of the mask.
+    pool can be given if it is already known (np.flatnonzero(mask))"""
+    if pool is None:
+        pool = np.flatnonzero(mask)
+    mask[pool[space.patterns([code], pool)[0] != feedback_pattern]] = False
+    return mask
@@ -0,0 +1,179 @@
+import random
+import multiprocessing as mp
+from multiprocessing import resource_tracker, shared_memory
+
+import numpy as np
+
+from game_stats import GameStats
+from utils import get_code_space
+
+MIN_TASKS = 64
+
+# state of a worker process
+WORKER_SOLVER = None
+WORKER_MEMORIES = {}
+
+
+class SharedPatternMatrix:
+    """Full pattern matrix of a code space, copied once in shared memory"""
+
+    def __init__(self, space):
+        self.config = (space.nb_colors, space.nb_pegs)
+        self.shape = (space.size, space.size)
+        self.memory = shared_memory.SharedMemory(create=True, size=space.size**2)
+        matrix = np.ndarray(self.shape, dtype=np.uint8, buffer=self.memory.buf)
+        matrix[:] = space.pattern_matrix
+
+    @property
+    def handle(self):
+        """What a worker needs to attach the matrix"""
+        return self.config, self.memory.name, self.shape
+
+    def close(self):
+        self.memory.close()
+        self.memory.unlink()
+
+
+def init_worker(solver):
+    global WORKER_SOLVER
+    WORKER_SOLVER = solver
+
+
+def attach_pattern_matrix(handle):
+    """Use the shared pattern matrix in the code space of the worker"""
+    config, name, shape = handle
+    if config in WORKER_MEMORIES:
+        return
+    try:
+        memory = shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        # before Python 3.13, attaching registers the memory to be deleted on exit
+        memory = shared_memory.SharedMemory(name=name)
+        resource_tracker.unregister(memory._name, "shared_memory")
+    WORKER_MEMORIES[config] = memory
+    matrix = np.ndarray(shape, dtype=np.uint8, buffer=memory.buf)
+    get_code_space(*config).set_pattern_matrix(matrix)
+
+
+def play_group(args):
+    """Task of a worker : play a group of games until they all end"""
+    nb_colors, group, parallel, seed, handle = args
+    if handle is not None:
+        attach_pattern_matrix(handle)
+    random.seed(seed)
+    return list(WORKER_SOLVER.play_groups(nb_colors, [group], parallel))
+
+
+def play_group_stats(args):
+    """Task of a worker : play a group of games, return their GameStats"""
+    nb_colors, group, parallel, seed, handle = args
+    if handle is not None:
+        attach_pattern_matrix(handle)
+    random.seed(seed)
+    games = WORKER_SOLVER.play_groups(nb_colors, [group], parallel)
+    return GameStats(nb_colors, WORKER_SOLVER.nb_pegs).add_games(games)
+
+
+def play_sample_games(solver, nb_colors, nb_games, seed_sequence):
+    """Play nb_games against secrets drawn from the random stream of seed_sequence
+    (a numpy SeedSequence), random choices of the solver included.
+    Return their GameStats."""
+    rng = np.random.default_rng(seed_sequence)
+    random.seed(int(rng.integers(2**63)))
+    space = solver.get_code_space(nb_colors)
+    secrets = rng.integers(space.size, size=nb_games)
+    # a secret drawn several times is played once and counted as many times
+    secrets, counts = np.unique(secrets, return_counts=True)
+    counts = dict(zip(secrets.tolist(), counts.tolist()))
+    game_stats = GameStats(nb_colors, solver.nb_pegs)
+    for game in solver.iter_games(nb_colors, secrets, pool_sizes=True):
+        game_stats.add_game(*game, count=counts[int(game[0])])
+    return game_stats
+
+
+def play_sample(args):
+    """Task of a worker : play a sample of games (see play_sample_games)"""
+    nb_colors, nb_games, seed_sequence, handle = args
+    if handle is not None:
+        attach_pattern_matrix(handle)
+    return play_sample_games(WORKER_SOLVER, nb_colors, nb_games, seed_sequence)
+
+
+class WorkerPool:
+    """Persistent pool of processes playing groups of games for a solver.
+    Workers share the pattern matrices instead of building their own copies."""
+
+    def __init__(self, solver, processes=None):
+        self.solver = solver
+        self.processes = processes or mp.cpu_count()
+        self.pool = mp.Pool(self.processes, initializer=init_worker, initargs=(solver,))
+        self.shared_matrices = {}
+
+    def get_matrix_handle(self, space):
+        # memory-mapped matrices are shared by the page cache already
+        if space.matrix_mode != "dense":
+            return None
+        config = (space.nb_colors, space.nb_pegs)
+        if config not in self.shared_matrices:
+            self.shared_matrices[config] = SharedPatternMatrix(space)
+        return self.shared_matrices[config].handle
+
+    def split_groups(self, nb_colors, parallel):
+        """Split the games of all codes in the main process until there are enough
+        groups, the biggest groups first. The split only depends on the solver, so
+        results do not depend on the number of processes."""
+        space = self.solver.get_code_space(nb_colors)
+        pool = space.all_codes()
+        games, groups = [], [(pool, pool, [], [], [])]
+        while groups and len(groups) < MIN_TASKS:
+            groups.sort(key=lambda group: len(group[1]))
+            new_games, sub_groups = self.solver.split_group(
+                nb_colors, groups.pop(), parallel
+            )
+            games.extend(new_games)
+            groups.extend(sub_groups)
+        return games, groups
+
+    def get_tasks(self, nb_colors, parallel, seed):
+        """Return the games ended while splitting the groups, and the tasks of the
+        groups. The groups are split with random.seed(seed), the state of the random
+        module being restored afterwards, and group i is played with
+        random.seed(seed + i)."""
+        random_state = random.getstate()
+        random.seed(seed)
+        try:
+            games, groups = self.split_groups(nb_colors, parallel)
+        finally:
+            random.setstate(random_state)
+        handle = self.get_matrix_handle(self.solver.get_code_space(nb_colors))
+        tasks = [
+            (nb_colors, group, parallel, seed + i, handle)
+            for i, group in enumerate(groups)
+        ]
+        return games, tasks
+
+    def solve_all_codes(self, nb_colors, parallel=True, seed=0, pool_sizes=False):
+        """Same results as MastermindSolver.solve_all_codes, in the order of the codes
+        (see get_tasks for the random choices)"""
+        games, tasks = self.get_tasks(nb_colors, parallel, seed)
+        for group_games in self.pool.imap(play_group, tasks):
+            games.extend(group_games)
+        if not pool_sizes:
+            games = [game[:3] for game in games]
+        return sorted(games, key=lambda game: game[0])
+
+    def get_game_stats(self, nb_colors, parallel=True, seed=0):
+        """GameStats of the games of all codes, each worker summarizing its groups
+        (see get_tasks for the random choices)"""
+        games, tasks = self.get_tasks(nb_colors, parallel, seed)
+        game_stats = GameStats(nb_colors, self.solver.nb_pegs).add_games(games)
+        for group_stats in self.pool.imap_unordered(play_group_stats, tasks):
+            game_stats.merge(group_stats)
+        return game_stats
+
+    def close(self):
+        self.pool.close()
+        self.pool.join()
+        for shared_matrix in self.shared_matrices.values():
+            shared_matrix.close()
+        self.shared_matrices = {}